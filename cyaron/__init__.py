@@ -10,6 +10,8 @@ from random import choice, randint, random, randrange, uniform
 
 #from .visual import visualize
 from . import log
+from .batch import Batch
+from .cache import OutputCache, ResultCache
 from .compare import Compare
 from .consts import *
 from .graph import Edge, Graph
@@ -18,6 +20,7 @@ from .math import *
 from .merger import Merger
 from .polygon import Polygon
 from .sequence import Sequence
+from .stress import Stress
 from .string import String
 from .utils import *
 from .vector import Vector
@@ -0,0 +1,179 @@
+"""
+A module that generates many test cases at once in a process pool.
+Classes:
+    Batch: run a generator function over a range of data ids in parallel.
+Usage from the command line, with the `cyaron-batch` script installed with the package:
+    cyaron-batch gen.py 1-50 --std ./std --prefix data --randseed=233
+"""
+
+import argparse
+import importlib
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Union
+
+from .io import IO
+from .utils import process_args
+
+__all__ = ["Batch"]
+
+
+def _run_case(
+    generator: Callable[[IO, int], Any],
+    data_id: int,
+    seed: Optional[str],
+    io_kwargs: dict,
+    std: Optional[Union[str, List[str]]],
+    time_limit: Optional[float],
+):
+    """Generate one test case. It runs inside the worker processes."""
+    random.seed(Batch.case_seed(seed, data_id))
+    with IO(data_id=data_id, **io_kwargs) as test:
+        generator(test, data_id)
+        result = None
+        if std is not None:
+            result = test.output_gen(std, time_limit)
+    return result
+
+
+class Batch:
+    """Generate many test cases in parallel."""
+
+    @staticmethod
+    def case_seed(seed: Optional[str], data_id: int):
+        """
+        Return the random seed used for the case `data_id`.
+        Args:
+            seed: the seed of the whole batch. If it's None, every case gets a fresh seed.
+            data_id: the id of the case.
+        """
+        if seed is None:
+            return None
+        return "{}#{}".format(seed, data_id)
+
+    @staticmethod
+    def run(generator: Callable[[IO, int], Any],
+            data_ids: Iterable[int],
+            *,
+            file_prefix: str = "data",
+            input_suffix: str = ".in",
+            output_suffix: str = ".out",
+            std: Optional[Union[str, List[str]]] = None,
+            time_limit: Optional[float] = None,
+            seed: Optional[str] = None,
+            max_workers: Optional[int] = None,
+            make_dirs: bool = False):
+        """
+        Call `generator(io, data_id)` for every id in `data_ids`, each in a
+        fresh `IO(file_prefix=file_prefix, data_id=data_id)`, then run the std program
+        on the generated input with `IO.output_gen`.
+        Args:
+            generator: the function that writes the input file. When running in a
+                process pool, it must be defined at the top level of a module.
+            data_ids: the ids of the cases to generate, e.g. `range(1, 11)`.
+            file_prefix: the prefix for the input and output files. Defaults to "data".
+            input_suffix: the suffix of the input files. Defaults to '.in'.
+            output_suffix: the suffix of the output files. Defaults to '.out'.
+            std: the std program. None means no output file is generated. Defaults to None.
+            time_limit: the time limit (seconds) of the std program. Defaults to None.
+            seed: the seed of the whole batch. Every case is seeded with a value derived
+                from it and its data id, so the result does not depend on the scheduling.
+                If it's None, use the `--randseed` command line argument if given.
+            max_workers: the number of worker processes. None means the number of CPUs.
+                0 or 1 means generating the cases one by one in this process.
+            make_dirs: set to True to create dir if path is not found. Defaults to False.
+        Returns:
+            The results of `IO.output_gen` in the order of `data_ids`.
+        """
+        if seed is None:
+            seed = process_args()
+        data_ids = list(data_ids)
+        io_kwargs = {
+            "file_prefix": file_prefix,
+            "input_suffix": input_suffix,
+            "output_suffix": output_suffix,
+            "disable_output": std is None,
+            "make_dirs": make_dirs,
+        }
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = min(max_workers, len(data_ids))
+        if max_workers <= 1:
+            return [
+                _run_case(generator, data_id, seed, io_kwargs, std, time_limit)
+                for data_id in data_ids
+            ]
+        count = len(data_ids)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            return list(
+                pool.map(_run_case, [generator] * count, data_ids,
+                         [seed] * count, [io_kwargs] * count, [std] * count,
+                         [time_limit] * count))
+
+
+def _parse_ids(spec: str):
+    """Parse data ids like "1-10", "3" or "1-5,8,10-12"."""
+    data_ids = []
+    for part in spec.split(","):
+        if "-" in part:
+            low, high = part.split("-", 1)
+            data_ids.extend(range(int(low), int(high) + 1))
+        else:
+            data_ids.append(int(part))
+    return data_ids
+
+
+def _load_generator(script: str, func: str):
+    """Import the generator function `func` from the python file `script`."""
+    directory, filename = os.path.split(os.path.abspath(script))
+    sys.path.insert(0, directory)
+    module = importlib.import_module(os.path.splitext(filename)[0])
+    return getattr(module, func)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    The command line entry point of the batch runner, the `cyaron-batch` script.
+    There is no `python -m cyaron.batch`, since the package imports this module
+    first and runpy would warn about it on every run.
+    """
+    parser = argparse.ArgumentParser(
+        prog="cyaron-batch",
+        description="Generate test cases in parallel with a generator "
+        "function `func(io, data_id)` defined in a python file.")
+    parser.add_argument("script", help="the python file of the generator")
+    parser.add_argument("ids", help='the data ids, like "1-10" or "1,3,5-7"')
+    parser.add_argument("--func",
+                        default="generate",
+                        help='the name of the generator function '
+                        '(default: "generate")')
+    parser.add_argument("--std", help="the std program")
+    parser.add_argument("--time-limit",
+                        type=float,
+                        help="the time limit (seconds) of the std program")
+    parser.add_argument("--prefix",
+                        default="data",
+                        help='the prefix of the files (default: "data")')
+    parser.add_argument("--input-suffix", default=".in")
+    parser.add_argument("--output-suffix", default=".out")
+    parser.add_argument("--randseed", help="the seed of the whole batch")
+    parser.add_argument("-j",
+                        "--jobs",
+                        type=int,
+                        help="the number of worker processes "
+                        "(default: the number of CPUs)")
+    parser.add_argument("--make-dirs", action="store_true")
+    args = parser.parse_args(argv)
+
+    Batch.run(_load_generator(args.script, args.func),
+              _parse_ids(args.ids),
+              file_prefix=args.prefix,
+              input_suffix=args.input_suffix,
+              output_suffix=args.output_suffix,
+              std=args.std,
+              time_limit=args.time_limit,
+              seed=args.randseed,
+              max_workers=args.jobs,
+              make_dirs=args.make_dirs)
@@ -0,0 +1,252 @@
+"""
+A module that caches the results of running programs on disk,
+keyed on the hash of their input and of the program itself.
+Classes:
+    OutputCache: a size-bounded LRU cache for the outputs of `IO.output_gen`.
+    ResultCache: a size-bounded LRU cache for the verdicts of `Compare.program`.
+"""
+
+import hashlib
+import os
+import pickle
+import shlex
+import shutil
+import tempfile
+from typing import Any, List, Optional, Union
+
+from .utils import _read_fd, _write_fd
+
+__all__ = ["OutputCache", "ResultCache"]
+
+_CHUNK_SIZE = 1 << 20
+_file_hashes = {}
+
+
+def hash_fd(fd: int):
+    """Return the hex SHA-256 digest of the whole content of the file descriptor `fd`."""
+    digest = hashlib.sha256()
+    for chunk in _read_fd(fd):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: str):
+    """
+    Return the hex SHA-256 digest of the file `path`.
+    The digest is remembered until the size or the mtime of the file changes.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+def hash_path(path: str):
+    """Return the hex SHA-256 digest of the file `path`, read again every time."""
+    with open(path, "rb") as f:
+        return hash_fd(f.fileno())
+
+
+def hash_command(shell_cmd: Union[str, List[str]]):
+    """
+    Return the hex SHA-256 digest of the command `shell_cmd` together with the content
+    of every file it refers to, such as the std binary or the script run by an interpreter.
+    """
+    if isinstance(shell_cmd, str):
+        try:
+            tokens = shlex.split(shell_cmd, posix=os.name == "posix")
+        except ValueError:
+            tokens = shell_cmd.split()
+    else:
+        tokens = list(shell_cmd)
+    digest = hashlib.sha256()
+    digest.update(repr(shell_cmd).encode("utf-8"))
+    for i, token in enumerate(tokens):
+        path = token
+        if i == 0 and not os.path.isfile(path):
+            path = shutil.which(token) or token
+        if os.path.isfile(path):
+            digest.update(b"\0" + hash_file(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+class _DiskCache:
+    """
+    A directory of cache entries, one file per key.
+    The least recently used entries are evicted once the cache grows over `max_size` bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        """
+        Args:
+            directory: the directory to keep the entries in. It will be created
+                if it does not exist.
+            max_size: the maximum total size (bytes) of the entries.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key)
+
+    def _touch(self, path: str):
+        try:
+            os.utime(path)  # mark it as recently used
+        except OSError:
+            pass
+
+    def _write(self, key: str, write):
+        """Call `write(f)` with a temp file in the cache, then turn it into the entry of `key`."""
+        tmp_fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(tmp_fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in `max_size`."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove all the entries."""
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                os.remove(entry.path)
+
+
+class OutputCache(_DiskCache):
+    """
+    A content-addressed cache of program outputs on disk.
+    The least recently used entries are evicted once the cache grows over `max_size` bytes.
+    """
+
+    def __init__(self,
+                 directory: str = ".cyaron_cache",
+                 max_size: int = 1 << 30):
+        """
+        Args:
+            directory: the directory to keep the cached outputs in. It will be created
+                if it does not exist. Defaults to ".cyaron_cache".
+            max_size: the maximum total size (bytes) of the cached outputs. Defaults to 1 GiB.
+        """
+        super().__init__(directory, max_size)
+
+    def key(self, input_fd: int, shell_cmd: Union[str, List[str]], *extra):
+        """
+        Return the cache key of running `shell_cmd` on the content of `input_fd`.
+        Args:
+            input_fd: the file descriptor of the input file.
+            shell_cmd: the command to run.
+            *extra: other values that affect the output, like `replace_EOL`.
+        """
+        digest = hashlib.sha256()
+        digest.update(hash_fd(input_fd).encode("ascii"))
+        digest.update(hash_command(shell_cmd).encode("ascii"))
+        digest.update(repr(extra).encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key: str, fd: int):
+        """
+        Write the cached output of `key` into the file descriptor `fd` at its current offset.
+        Returns:
+            the number of bytes written, or None if `key` is not cached.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        size = 0
+        with f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                _write_fd(fd, chunk)
+                size += len(chunk)
+        self._touch(path)
+        return size
+
+    def store(self, key: str, fd: int, start: int, end: int):
+        """
+        Cache the bytes between `start` and `end` of the file descriptor `fd` as the output
+        of `key`, then evict the least recently used entries if the cache is too large.
+        """
+
+        def write(f):
+            for chunk in _read_fd(fd, start, end):
+                f.write(chunk)
+
+        self._write(key, write)
+
+
+class ResultCache(_DiskCache):
+    """
+    A cache of the verdicts and the resource usage of programs compared by
+    `Compare.program`, keyed on the program, its input and the expected output.
+    The least recently used entries are evicted once the cache grows over `max_size` bytes.
+    """
+
+    def __init__(self,
+                 directory: str = ".cyaron_results",
+                 max_size: int = 1 << 28):
+        """
+        Args:
+            directory: the directory to keep the verdicts in. It will be created
+                if it does not exist. Defaults to ".cyaron_results".
+            max_size: the maximum total size (bytes) of the verdicts. Defaults to 256 MiB.
+        """
+        super().__init__(directory, max_size)
+
+    def key(self, program: Union[str, List[str]], input_hash: str, *extra):
+        """
+        Return the cache key of comparing `program` on an input.
+        Args:
+            program: the command of the program.
+            input_hash: the hash of the input file.
+            *extra: other values that affect the verdict, like the grader and the
+                hash of the std program or of the expected output.
+        """
+        digest = hashlib.sha256()
+        digest.update(input_hash.encode("ascii"))
+        digest.update(hash_command(program).encode("ascii"))
+        digest.update(repr(extra).encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Any]:
+        """Return the cached verdict of `key`, or None if it is not cached."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        self._touch(path)
+        return value
+
+    def store(self, key: str, value: Any):
+        """Cache the verdict `value` of `key`."""
+        self._write(key, lambda f: pickle.dump(value, f))
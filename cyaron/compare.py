@@ -3,10 +3,18 @@ from .io import IO
 from . import log
 from cyaron.utils import *
 from cyaron.consts import *
-from cyaron.graders import CYaRonGraders
+from cyaron.graders import CYaRonGraders, FileContent, TextContent
+from cyaron.graders.mismatch import CachedMismatch
+from .cache import hash_command, hash_fd, hash_path
+from .compression import decompressed_pipe
+from .process import check_output, stream_output
 import subprocess
 import multiprocessing
 import sys
+import tempfile
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed, wait)
+from contextlib import contextmanager
 from io import open
 import os
 
@@ -22,11 +30,166 @@ class CompareMismatch(ValueError):
         return "In program: '{}'. {}".format(self.name, self.mismatch)
 
 
+class CompareMismatchGroup(CompareMismatch):
+    """All the mismatches found by one Compare call, in the order of the programs."""
+
+    def __init__(self, mismatches):
+        first = mismatches[0]
+        super(CompareMismatchGroup, self).__init__(first.name, first.mismatch)
+        self.args = (mismatches, )  # so that it can be pickled
+        self.mismatches = mismatches
+
+    def __str__(self):
+        return "{} mismatches:\n{}".format(
+            len(self.mismatches), "\n".join(map(str, self.mismatches)))
+
+
+@contextmanager
+def _open_input(path, compression):
+    """Open the input file `path` to send it to a program as stdin."""
+    if compression is None:
+        with open(path, "rb") as f:
+            yield f
+    else:
+        with decompressed_pipe(path, compression) as read_fd:
+            yield read_fd
+
+
+def _grade(grader, content, std, input=None):
+    """Grade one output with the `Grader` `grader`. It also runs inside the worker processes."""
+    try:
+        return grader(content, std, input)
+    finally:
+        if isinstance(content, FileContent):
+            content.close()
+
+
+def _grade_file(file_name, content, grader, std, input=None):
+    """Grade one output file. Returns its name and the verdict as (result, info)."""
+    return file_name, _grade(grader, content, std, input)
+
+
+def _split_timeout(program_name):
+    """Split a program given as (command, time limit) into the two."""
+    if (list_like(program_name) and len(program_name) == 2
+            and isinstance(program_name[-1], (int, float))):
+        return program_name
+    return program_name, None
+
+
+class _GraderError(Exception):
+    """A failure of the grader itself, like a checker crash, told apart from the program's."""
+
+    def __init__(self, error):
+        super(_GraderError, self).__init__(error)
+        self.error = error
+
+
+def _grade_output(grade, *args):
+    """Call `grade(*args)`, wrapping the failures of a checker into `_GraderError`."""
+    try:
+        return grade(*args)
+    except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
+        raise _GraderError(e) from e
+
+
+def _run_program(program_name,
+                 stdin,
+                 std,
+                 grader,
+                 memory_limit,
+                 stream,
+                 input=None):
+    """
+    Run one program with `stdin` and grade its output with the `Grader` `grader`.
+    `input` is the `FileContent` of the input for the graders that look at it.
+    Returns:
+        the name of the program, the verdict of the grader as (result, info),
+        and the `ProcessResult` of the program
+    """
+    program_name, timeout = _split_timeout(program_name)
+    if stream:
+        # stop the program at the first certain mismatch
+        checker = grader.open_stream(std)
+        content, result, _ = stream_output(
+            program_name,
+            checker.feed,
+            shell=(not list_like(program_name)),
+            stdin=stdin,
+            timeout=timeout,
+            memory_limit=memory_limit,
+        )
+        verdict = _grade_output(checker.result, make_unicode(content))
+        return program_name, verdict, result
+    content, result = check_output(
+        program_name,
+        shell=(not list_like(program_name)),
+        stdin=stdin,
+        timeout=timeout,
+        memory_limit=memory_limit,
+    )
+    verdict = _grade_output(grader, make_unicode(content), std, input)
+    return program_name, verdict, result
+
+
+def _run_program_file(program_name, input_path, input_compression, std, grader,
+                      memory_limit, stream):
+    """`_run_program` on the input file `input_path`, run by the worker processes."""
+    input = FileContent(input_path, input_compression, encoding="utf-8")
+    with _open_input(input_path, input_compression) as stdin:
+        return _run_program(program_name, stdin, std, grader, memory_limit,
+                            stream, input)
+
+
+def _cache_entry(cached):
+    """
+    The verdict to store into the `ResultCache`: the mismatch is replaced with
+    its message, and the output of the program is dropped from the errors.
+    """
+    value, error = cached
+    if value is not None:
+        name, (result, info), process_result = value
+        if info is not None:
+            info = CachedMismatch(str(info))
+        value = name, (result, info), process_result
+    elif isinstance(error, subprocess.TimeoutExpired):
+        error = subprocess.TimeoutExpired(error.cmd, error.timeout)
+    else:
+        error = subprocess.CalledProcessError(error.returncode, error.cmd)
+    return value, error
+
+
+def _run_program_cached(cached, cache, key, run, *args):
+    """
+    Return the verdict of a program from `cached`, the entry loaded from the
+    `ResultCache`, or call `run(*args)` and store its verdict into `cache`.
+    The program crashing or running out of time is cached and raised again as well,
+    but the grader failing is never cached, since it says nothing about the program.
+    """
+    if cached is None:
+        try:
+            cached = (run(*args), None)
+        except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
+            cached = (None, e)
+        except _GraderError as e:
+            raise e.error from None
+        if cache is not None:
+            cache.store(key, _cache_entry(cached))
+    value, error = cached
+    if error is not None:
+        raise error
+    return value
+
+
 class Compare:
 
     @staticmethod
-    def __compare_two(name, content, std, grader):
-        (result, info) = CYaRonGraders.invoke(grader, content, std)
+    def __compare_two(name, content, std, grader, input=None):
+        (result, info) = _grade(grader, content, std, input)
+        Compare.__report(name, result, info)
+
+    @staticmethod
+    def __report(name, result, info):
         status = "Correct" if result else "!!!INCORRECT!!!"
         info = info if info is not None else ""
         log.debug("{}: {} {}".format(name, status, info))
@@ -35,13 +198,174 @@ class Compare:
 
     @staticmethod
     def __process_file(file):
+        """
+        Return the name and the content of `file`. Files on disk are given as
+        a `FileContent` that maps the file into memory instead of reading it.
+        """
         if isinstance(file, IO):
             file.flush_buffer()
-            file.output_file.seek(0)
-            return file.output_filename, file.output_file.read()
+            if file.output_filename is None:
+                file.output_file.seek(0)
+                return file.output_filename, TextContent(
+                    file.output_file.read())
+            file.output_file.flush()
+            content = FileContent(file.output_filename,
+                                  file.output_compression,
+                                  encoding="utf-8")
+            return file.output_filename, content
+        else:
+            # decoded with the locale encoding, like `open` did before
+            return file, FileContent(file)
+
+    @staticmethod
+    def __input_content(input):
+        """
+        Return the `FileContent` of the input file, given as an `IO` or a path,
+        for the graders that look at the input, or None if it has no file.
+        """
+        if isinstance(input, IO):
+            input.flush_buffer()
+            if input.input_filename is None:
+                return None
+            input.input_file.flush()
+            return FileContent(input.input_filename,
+                               input.input_compression,
+                               encoding="utf-8")
+        return FileContent(input) if input is not None else None
+
+    @staticmethod
+    def __cache_keys(cache, programs, input, std, std_program, grader,
+                     memory_limit):
+        """The keys of the verdicts of `programs` in the `ResultCache` `cache`."""
+        if input.input_filename is not None:
+            input_hash = hash_path(input.input_filename)
+        else:
+            input_hash = hash_fd(input.input_file.fileno())
+        if std_program is not None:
+            std_hash = ("std_program", hash_command(std_program))
+        elif isinstance(std, IO):
+            std.flush_buffer()
+            std.output_file.flush()
+            if std.output_filename is not None:
+                std_hash = ("std", hash_path(std.output_filename))
+            else:
+                std_hash = ("std", hash_fd(std.output_file.fileno()))
+        else:
+            std_hash = ("std", hash_path(std))
+        grader_hash = CYaRonGraders.fingerprint(grader)
+        keys = []
+        for program in programs:
+            program, timeout = _split_timeout(program)
+            keys.append(
+                cache.key(program, input_hash, std_hash, grader, grader_hash,
+                          timeout, memory_limit))
+        return keys
+
+    @staticmethod
+    @contextmanager
+    def __std_file(std):
+        """
+        Give `std` to the worker processes as a `FileContent`. A `TextContent`, like
+        the output of the std program, is written into a temp file once and removed
+        at the end, instead of being pickled into every task.
+        """
+        if not isinstance(std, TextContent):
+            yield std
+            return
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(std.encode("utf-8"))
+            yield FileContent(path, encoding="utf-8")
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def __close(content):
+        if isinstance(content, FileContent):
+            content.close()
+
+    @staticmethod
+    def __run_all(job_pool, func, args_list, handle, stop_on_incorrect):
+        """
+        Call `func(*args)` for every args in `args_list`, in `job_pool` if it's not None,
+        and pass every return value to `handle` as it finishes.
+        Without `stop_on_incorrect`, every mismatch is collected and raised together
+        at the end. With it, the queued calls are cancelled at the first mismatch.
+        Returns:
+            the values returned by `handle`, in the order of `args_list`
+        """
+        results = [None] * len(args_list)
+        mismatches = []
+        error = None
+
+        def finish(index, get):
+            nonlocal error
+            try:
+                results[index] = handle(get())
+            except CompareMismatch as e:
+                mismatches.append((index, e))
+            except Exception as e:
+                if error is None:
+                    error = e
+            return stop_on_incorrect and (mismatches or error is not None)
+
+        if job_pool is None:
+            for index, args in enumerate(args_list):
+                if finish(index, lambda: func(*args)):
+                    break
         else:
-            with open(file, "r", newline="\n") as f:
-                return file, f.read()
+            futures = {
+                job_pool.submit(func, *args): index
+                for index, args in enumerate(args_list)
+            }
+            for future in as_completed(futures):
+                if finish(futures[future], future.result):
+                    for queued in futures:
+                        queued.cancel()
+                    break
+            wait(futures)  # the running ones can not be cancelled
+
+        if error is not None:
+            raise error
+        if len(mismatches) == 1:
+            raise mismatches[0][1]
+        if mismatches:
+            mismatches.sort(key=lambda item: item[0])
+            raise CompareMismatchGroup([e for _, e in mismatches])
+        return results
+
+    @staticmethod
+    def __make_pool(executor, max_workers):
+        if executor == "thread":
+            return ThreadPoolExecutor(max_workers=max_workers)
+        if executor == "process":
+            if max_workers is not None and max_workers < 0:
+                max_workers = None
+            return ProcessPoolExecutor(max_workers=max_workers)
+        raise ValueError(
+            "executor should be 'thread' or 'process', got {!r}".format(
+                executor))
+
+    @staticmethod
+    @contextmanager
+    def __input_stdin(input):
+        if input.input_compression is None and input.input_filename is not None:
+            # a file of its own, since a dup shares the offset between the programs
+            with open(input.input_filename, "rb") as input_file:
+                yield input_file
+        elif input.input_compression is None:
+            with open(os.dup(input.input_file.fileno()), "r",
+                      newline="\n") as input_file:
+                yield input_file
+                input_file.seek(0)
+        else:
+            with decompressed_pipe(input.input_filename,
+                                   input.input_compression) as read_fd:
+                yield read_fd
 
     @staticmethod
     def __normal_max_workers(workers):
@@ -62,33 +386,61 @@ class Compare:
                 ("max_workers", -1),
                 ("job_pool", None),
                 ("stop_on_incorrect", None),
+                ("executor", "thread"),
+                ("input", None),
             ),
         )
         std = kwargs["std"]
         grader = kwargs["grader"]
         max_workers = kwargs["max_workers"]
         job_pool = kwargs["job_pool"]
-        if kwargs["stop_on_incorrect"] is not None:
-            log.warn(
-                "parameter stop_on_incorrect is deprecated and has no effect.")
+        executor = kwargs["executor"]
+        stop_on_incorrect = kwargs["stop_on_incorrect"]
+        input = kwargs["input"]
 
-        if (max_workers is None or max_workers >= 0) and job_pool is None:
+        if job_pool is None and (executor != "thread" or max_workers is None
+                                 or max_workers >= 0):
             max_workers = cls.__normal_max_workers(max_workers)
-            try:
-                from concurrent.futures import ThreadPoolExecutor
-
-                with ThreadPoolExecutor(max_workers=max_workers) as job_pool:
-                    return cls.output(*files,
-                                      std=std,
-                                      grader=grader,
-                                      max_workers=max_workers,
-                                      job_pool=job_pool)
-            except ImportError:
-                pass
+            with cls.__make_pool(executor, max_workers) as job_pool:
+                return cls.output(*files,
+                                  std=std,
+                                  grader=grader,
+                                  max_workers=max_workers,
+                                  job_pool=job_pool,
+                                  stop_on_incorrect=stop_on_incorrect,
+                                  input=input)
+
+        # the workers get the grader itself, which may not be registered in them
+        grader = CYaRonGraders.get(grader)
+        # the input of std is the input of the outputs if it is not given
+        if input is None and isinstance(std, IO):
+            input = std
+        input = cls.__input_content(input)
 
         def get_std():
             return cls.__process_file(std)[1]
 
+        if stop_on_incorrect is None:
+            stop_on_incorrect = job_pool is None
+
+        if isinstance(job_pool, ProcessPoolExecutor):
+            # the files are opened by path in the workers, not sent to them
+            std = get_std()
+            try:
+                with cls.__std_file(std) as std_file:
+                    args_list = [
+                        cls.__process_file(file) + (grader, std_file, input)
+                        for file in files
+                    ]
+                    cls.__run_all(
+                        job_pool, _grade_file, args_list,
+                        lambda value: cls.__report(value[0], *value[1]),
+                        stop_on_incorrect)
+            finally:
+                cls.__close(std)
+                cls.__close(input)
+            return
+
         if job_pool is not None:
             std = job_pool.submit(get_std).result()
         else:
@@ -96,12 +448,18 @@ class Compare:
 
         def do(file):
             (file_name, content) = cls.__process_file(file)
-            cls.__compare_two(file_name, content, std, grader)
+            try:
+                cls.__compare_two(file_name, content, std, grader, input)
+            finally:
+                cls.__close(content)
 
-        if job_pool is not None:
-            job_pool.map(do, files)
-        else:
-            [x for x in map(do, files)]
+        try:
+            args_list = [(file, ) for file in files]
+            cls.__run_all(job_pool, do, args_list, lambda value: value,
+                          stop_on_incorrect)
+        finally:
+            cls.__close(std)
+            cls.__close(input)
 
     @classmethod
     def program(cls, *programs, **kwargs):
@@ -116,6 +474,10 @@ class Compare:
                 ("max_workers", -1),
                 ("job_pool", None),
                 ("stop_on_incorrect", None),
+                ("memory_limit", None),
+                ("stream", False),
+                ("executor", "thread"),
+                ("cache", None),
             ),
         )
         input = kwargs["input"]
@@ -124,49 +486,61 @@ class Compare:
         grader = kwargs["grader"]
         max_workers = kwargs["max_workers"]
         job_pool = kwargs["job_pool"]
-        if kwargs["stop_on_incorrect"] is not None:
-            log.warn(
-                "parameter stop_on_incorrect is deprecated and has no effect.")
+        memory_limit = kwargs["memory_limit"]
+        stream = kwargs["stream"]
+        executor = kwargs["executor"]
+        stop_on_incorrect = kwargs["stop_on_incorrect"]
+        cache = kwargs["cache"]
 
-        if (max_workers is None or max_workers >= 0) and job_pool is None:
+        if job_pool is None and (executor != "thread" or max_workers is None
+                                 or max_workers >= 0):
             max_workers = cls.__normal_max_workers(max_workers)
-            try:
-                from concurrent.futures import ThreadPoolExecutor
-
-                with ThreadPoolExecutor(max_workers=max_workers) as job_pool:
-                    return cls.program(*programs,
-                                       input=input,
-                                       std=std,
-                                       std_program=std_program,
-                                       grader=grader,
-                                       max_workers=max_workers,
-                                       job_pool=job_pool)
-            except ImportError:
-                pass
+            with cls.__make_pool(executor, max_workers) as job_pool:
+                return cls.program(*programs,
+                                   input=input,
+                                   std=std,
+                                   std_program=std_program,
+                                   grader=grader,
+                                   max_workers=max_workers,
+                                   job_pool=job_pool,
+                                   memory_limit=memory_limit,
+                                   stream=stream,
+                                   stop_on_incorrect=stop_on_incorrect,
+                                   cache=cache)
+        process_pool = isinstance(job_pool, ProcessPoolExecutor)
 
         if not isinstance(input, IO):
             raise TypeError("expect {}, got {}".format(
                 type(IO).__name__,
                 type(input).__name__))
         input.flush_buffer()
-        input.input_file.seek(0)
+        if input.input_compression is None:
+            input.input_file.seek(0)
+        if process_pool and input.input_filename is None:
+            raise ValueError("the input file should have a name "
+                             "to be read by the worker processes")
 
-        if std_program is not None:
+        keys = [None] * len(programs)
+        cached = [None] * len(programs)
+        if cache is not None and (std is not None or std_program is not None):
+            keys = cls.__cache_keys(cache, programs, input, std, std_program,
+                                    grader, memory_limit)
+            cached = [cache.load(key) for key in keys]
+        if all(entry is not None for entry in cached):
+            std = None  # every verdict is cached, so std is not needed
+        elif std_program is not None:
 
             def get_std():
-                with open(os.dup(input.input_file.fileno()), "r",
-                          newline="\n") as input_file:
-                    content = make_unicode(
-                        subprocess.check_output(
-                            std_program,
-                            shell=(not list_like(std_program)),
-                            stdin=input.input_file,
-                            universal_newlines=True,
-                        ))
-                    input_file.seek(0)
-                return content
-
-            if job_pool is not None:
+                with cls.__input_stdin(input) as stdin:
+                    content, _ = check_output(
+                        std_program,
+                        shell=(not list_like(std_program)),
+                        stdin=stdin,
+                        memory_limit=memory_limit,
+                    )
+                return TextContent(make_unicode(content))
+
+            if job_pool is not None and not process_pool:
                 std = job_pool.submit(get_std).result()
             else:
                 std = get_std()
@@ -175,7 +549,7 @@ class Compare:
             def get_std():
                 return cls.__process_file(std)[1]
 
-            if job_pool is not None:
+            if job_pool is not None and not process_pool:
                 std = job_pool.submit(get_std).result()
             else:
                 std = get_std()
@@ -184,34 +558,45 @@ class Compare:
                 "program() missing 1 required non-None keyword-only argument: 'std' or 'std_program'"
             )
 
-        def do(program_name):
-            timeout = None
-            if (list_like(program_name) and len(program_name) == 2
-                    and int_like(program_name[-1])):
-                program_name, timeout = program_name
-            with open(os.dup(input.input_file.fileno()), "r",
-                      newline="\n") as input_file:
-                if timeout is None:
-                    content = make_unicode(
-                        subprocess.check_output(
-                            program_name,
-                            shell=(not list_like(program_name)),
-                            stdin=input_file,
-                            universal_newlines=True,
-                        ))
-                else:
-                    content = make_unicode(
-                        subprocess.check_output(
-                            program_name,
-                            shell=(not list_like(program_name)),
-                            stdin=input_file,
-                            universal_newlines=True,
-                            timeout=timeout,
-                        ))
-                input_file.seek(0)
-            cls.__compare_two(program_name, content, std, grader)
+        if stream and not CYaRonGraders.check_stream(grader):
+            log.warn("grader {} can not compare while the program runs, "
+                     "parameter stream has no effect.".format(grader))
+            stream = False
+        # the workers get the grader itself, which may not be registered in them
+        grader = CYaRonGraders.get(grader)
 
-        if job_pool is not None:
-            job_pool.map(do, programs)
-        else:
-            [x for x in map(do, programs)]
+        input_content = cls.__input_content(input)
+
+        def run(program_name):
+            with cls.__input_stdin(input) as stdin:
+                return _run_program(program_name, stdin, std, grader,
+                                    memory_limit, stream, input_content)
+
+        if stop_on_incorrect is None:
+            stop_on_incorrect = job_pool is None
+
+        def handle(value):
+            name, (result, info), process_result = value
+            cls.__report(name, result, info)
+            return process_result
+
+        try:
+            if not process_pool:
+                args_list = [
+                    (entry, cache, key, run, program)
+                    for program, key, entry in zip(programs, keys, cached)
+                ]
+                return cls.__run_all(job_pool, _run_program_cached, args_list,
+                                     handle, stop_on_incorrect)
+            with cls.__std_file(std) as std_file:
+                args_list = [
+                    (entry, cache, key, _run_program_file, program,
+                     input.input_filename, input.input_compression, std_file,
+                     grader, memory_limit, stream)
+                    for program, key, entry in zip(programs, keys, cached)
+                ]
+                return cls.__run_all(job_pool, _run_program_cached, args_list,
+                                     handle, stop_on_incorrect)
+        finally:
+            cls.__close(std)
+            cls.__close(input_content)
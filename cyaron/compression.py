@@ -0,0 +1,227 @@
+"""
+A module that reads and writes compressed test data files.
+Supported compressions are "gzip" (.gz), "xz" (.xz) and "zstd" (.zst).
+zstd needs the optional package `zstandard`.
+"""
+
+import gzip
+import io
+import lzma
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = [
+    "SUFFIXES", "detect_compression", "open_compressed", "CompressedWriter",
+    "open_text", "decompressed_pipe"
+]
+
+SUFFIXES = {"gzip": ".gz", "xz": ".xz", "zstd": ".zst"}
+
+_CHUNK_SIZE = 1 << 20
+
+
+def detect_compression(filename: str) -> Optional[str]:
+    """Return the compression implied by the suffix of `filename`, or None."""
+    for compression, suffix in SUFFIXES.items():
+        if filename.endswith(suffix):
+            return compression
+    return None
+
+
+def _check_compression(compression: str):
+    if compression not in SUFFIXES:
+        raise ValueError("unknown compression {!r}, expected one of {}".format(
+            compression, ", ".join(SUFFIXES)))
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("zstd compression needs the package 'zstandard'")
+
+
+def open_compressed(fileobj, mode: str, compression: str):
+    """
+    Open a binary compressed stream over the binary file object `fileobj`.
+    Closing the stream does not close `fileobj`.
+    Args:
+        fileobj: the underlying binary file object.
+        mode: "rb" or "wb".
+        compression: "gzip", "xz" or "zstd".
+    """
+    _check_compression(compression)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode=mode)
+    if compression == "xz":
+        return lzma.LZMAFile(fileobj, mode)
+    if mode == "rb":
+        return zstandard.ZstdDecompressor().stream_reader(
+            fileobj, read_across_frames=True, closefd=False)
+    return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+
+
+class CompressedWriter(io.BufferedIOBase):
+    """
+    A binary stream that compresses everything written to it into a file.
+    Every `flush()` finishes the current gzip member, xz stream or zstd frame,
+    so the file is always complete and readable after flushing. Writing after
+    that starts a new one, which the decompressors read as a continuation.
+    It can only be truncated to 0, and seeking is limited to the current position.
+    """
+
+    def __init__(self, filename: str, compression: str):
+        """
+        Args:
+            filename: the file to write.
+            compression: "gzip", "xz" or "zstd".
+        """
+        super().__init__()
+        _check_compression(compression)
+        self.name = filename
+        self.compression = compression
+        self.__raw = open(filename, "wb")
+        self.__stream = None
+        self.__dirty = False
+        self.__pos = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self) -> int:
+        """Return the number of uncompressed bytes written."""
+        return self.__pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence != io.SEEK_SET:
+            pos += self.__pos  # the end is always the current position
+        if pos != self.__pos:
+            raise io.UnsupportedOperation(
+                "a compressed file can not seek to another position")
+        return pos
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        if self.__stream is None:
+            self.__stream = open_compressed(self.__raw, "wb", self.compression)
+        self.__stream.write(data)
+        size = memoryview(data).nbytes
+        self.__pos += size
+        self.__dirty = True
+        return size
+
+    def flush(self):
+        if self.closed:
+            return
+        if self.__stream is not None and self.__dirty:
+            self.__stream.close()
+            self.__stream = None
+            self.__dirty = False
+        self.__raw.flush()
+
+    def truncate(self, pos=None):
+        if pos not in (None, 0):
+            raise io.UnsupportedOperation(
+                "a compressed file can only be truncated to 0")
+        if self.__stream is not None:
+            self.__stream.close()
+        self.__stream = None
+        self.__dirty = False
+        self.__pos = 0
+        self.__raw.seek(0)
+        return self.__raw.truncate(0)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()  # it flushes the last member
+        finally:
+            self.__raw.close()
+
+
+def open_text(filename: str, compression: Optional[str] = None):
+    """
+    Open the possibly compressed file `filename` as text for reading.
+    Args:
+        filename: the file to read.
+        compression: "gzip", "xz", "zstd", or None to detect it from the suffix.
+            Files without a known suffix are read as plain text.
+    """
+    if compression is None:
+        compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, "r", newline="\n")
+    raw = open(filename, "rb")
+    try:
+        stream = open_compressed(raw, "rb", compression)
+    except BaseException:
+        raw.close()
+        raise
+    return io.TextIOWrapper(_ClosingReader(stream, raw),
+                            encoding="utf-8",
+                            newline="\n")
+
+
+class _ClosingReader(io.BufferedIOBase):
+    """A readable binary stream that also closes the underlying file."""
+
+    def __init__(self, stream, raw):
+        super().__init__()
+        self.__stream = stream
+        self.__raw = raw
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self.__stream.read(size)
+
+    def read1(self, size=-1):
+        return self.__stream.read(_CHUNK_SIZE if size < 0 else size)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.__stream.close()
+            finally:
+                self.__raw.close()
+                super().close()
+
+
+@contextmanager
+def decompressed_pipe(filename: str, compression: str):
+    """
+    Decompress `filename` into a pipe in a background thread, so that a program
+    can read the data from its stdin. Use it as a context manager that gives
+    the file descriptor of the read end. Start the program inside the `with` block.
+    """
+    read_fd, write_fd = os.pipe()
+
+    def pump():
+        try:
+            with open(filename, "rb") as raw:
+                with open_compressed(raw, "rb", compression) as src:
+                    for chunk in iter(lambda: src.read(_CHUNK_SIZE), b""):
+                        view = memoryview(chunk)
+                        while view:
+                            view = view[os.write(write_fd, view):]
+        except BrokenPipeError:
+            pass  # the program exited without reading everything
+        finally:
+            os.close(write_fd)
+
+    thread = threading.Thread(target=pump, daemon=True)
+    thread.start()
+    try:
+        yield read_fd
+    finally:
+        # closing the read end first wakes the thread up if it is blocked
+        os.close(read_fd)
+        thread.join()
@@ -1,4 +1,7 @@
 from .graderregistry import CYaRonGraders
+from .filecontent import FileContent, TextContent
+from .checker import ExternalChecker
 
 from .fulltext import fulltext
-from .noipstyle import noipstyle
\ No newline at end of file
+from .noipstyle import noipstyle
+from .floatstyle import floatstyle, float_grader
@@ -0,0 +1,150 @@
+import os
+import subprocess
+import tempfile
+import weakref
+
+from ..cache import hash_command
+from ..process import AccountedPopen, kill_process_group
+from ..utils import escape_path, list_like
+from .filecontent import FileContent, TextContent, as_buffer, as_text
+from .mismatch import CheckerMismatch
+
+# the exit codes of testlib checkers
+VERDICTS = {
+    0: "ok",
+    1: "wrong answer",
+    2: "wrong output format",
+    4: "wrong output format",  # extra information in the output file
+    7: "points",
+    8: "unexpected eof",
+}
+PC_BASE_EXIT_CODE = 16
+
+
+def _write_temp(content):
+    fd, path = tempfile.mkstemp(suffix=".txt")
+    with os.fdopen(fd, "wb") as f:
+        f.write(as_buffer(content))
+    return path
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _Paths:
+    """
+    The paths of the files to give to a checker. Uncompressed files are used
+    in place, other contents are written into temp files, removed on `close()`.
+    The temp file of a `TextContent`, like the output of the std program,
+    is kept in its cache and removed with it, since it is checked many times,
+    unless the checker fails.
+    """
+
+    def __init__(self):
+        self.temp_files = []
+        # the contents whose cached temp file is given to the checker
+        self.cached_contents = []
+
+    def get(self, content):
+        if content is None:
+            return os.devnull
+        if isinstance(content, FileContent) and content.compression is None:
+            return content.path
+        if isinstance(content, TextContent):
+            if "checker_path" not in content.cache:
+                path = _write_temp(content)
+                content.cache["checker_path"] = path
+                content.cache["checker_remove"] = weakref.finalize(
+                    content, _remove, path)
+            self.cached_contents.append(content)
+            return content.cache["checker_path"]
+        path = _write_temp(content)
+        self.temp_files.append(path)
+        return path
+
+    def close(self, failed=False):
+        """
+        Remove the temp files. If the checker failed, the ones written into
+        the caches are removed as well, since the content may never be
+        collected, like in a worker process that stops.
+        """
+        for path in self.temp_files:
+            _remove(path)
+        self.temp_files = []
+        if failed:
+            for content in self.cached_contents:
+                if "checker_path" in content.cache:
+                    del content.cache["checker_path"]
+                    content.cache.pop("checker_remove")()
+        self.cached_contents = []
+
+
+class ExternalChecker:
+    """
+    A grader that runs a testlib-style checker as
+    `command <input> <output> <answer>`, and judges by its exit code:
+    0 is accepted, 1, 2, 4, 7, 8 and the partially correct codes are rejected
+    with the message the checker wrote to stderr, and other codes, like the
+    FAIL code 3, mean that the checker itself failed.
+    """
+
+    def __init__(self, command, timeout=None):
+        """
+        command -> the checker, a str run by the shell or a list of arguments
+        timeout -> the time limit (seconds) of the checker, None means no limit
+        """
+        self.command = command
+        self.timeout = timeout
+
+    def __repr__(self):
+        return "ExternalChecker(%r)" % (self.command, )
+
+    def fingerprint(self):
+        """fingerprint(self) -> str: the hash of the command and of the files it runs"""
+        return hash_command(self.command)
+
+    def __call__(self, content, std, input=None):
+        paths = _Paths()
+        failed = True
+        try:
+            files = [paths.get(input), paths.get(content), paths.get(std)]
+            if list_like(self.command):
+                args = list(self.command) + files
+            else:
+                args = " ".join([self.command] + list(map(escape_path, files)))
+            with AccountedPopen(args,
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True,
+                                shell=not list_like(self.command),
+                                new_session=True) as proc:
+                try:
+                    output, message = proc.communicate(timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    kill_process_group(proc)
+                    proc.communicate()
+                    raise
+            code = proc.returncode
+            failed = not (code == 0 or code in VERDICTS
+                          or code >= PC_BASE_EXIT_CODE)
+        finally:
+            paths.close(failed)
+
+        if failed:
+            raise subprocess.CalledProcessError(code,
+                                                args,
+                                                output=output,
+                                                stderr=message)
+        if code == 0:
+            return True, None
+        if code in VERDICTS:
+            verdict = VERDICTS[code]
+        else:
+            verdict = "partially correct"
+        return False, CheckerMismatch(as_text(content), as_text(std), verdict,
+                                      message.strip(), code)
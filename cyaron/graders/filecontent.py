@@ -0,0 +1,183 @@
+import codecs
+import locale
+import mmap
+import os
+import threading
+
+from ..compression import detect_compression, open_text
+
+_unpickled_caches = {}
+
+
+class FileContent:
+    """
+    The content of a file, mapped into memory instead of read into a str,
+    so that graders can look at huge outputs without copying them.
+    Compressed files can not be mapped and are decompressed into memory instead.
+    """
+
+    def __init__(self, path, compression=None, encoding=None):
+        """
+        path -> the path of the file
+        compression -> "gzip", "xz", "zstd", or None to detect it from the suffix
+        encoding -> the encoding of the text, None means UTF-8 for compressed files
+            and the locale encoding for others, like `open_text`
+        """
+        self.path = path
+        self.compression = compression if compression is not None \
+            else detect_compression(path)
+        if encoding is None:
+            encoding = "utf-8" if self.compression is not None \
+                else locale.getpreferredencoding(False)
+        self.encoding = encoding
+        self.is_utf8 = codecs.lookup(encoding).name == "utf-8"
+        self.cache = {}
+        self.__file = None
+        self.__buffer = None
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        # only the path is sent to other processes, they map the file again
+        return {
+            "path": self.path,
+            "compression": self.compression,
+            "encoding": self.encoding
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["compression"], state["encoding"])
+        # a worker process gets the same file many times, like the std output
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        key = (os.path.abspath(self.path), self.compression, self.encoding,
+               stat.st_size, stat.st_mtime_ns)
+        self.cache = _unpickled_caches.setdefault(key, {})
+
+    def __repr__(self):
+        return "FileContent(%r)" % self.path
+
+    def buffer(self):
+        """buffer(self) -> mmap or bytes: the raw bytes of the file"""
+        with self.__lock:
+            if self.__buffer is None:
+                self.__open()
+            return self.__buffer
+
+    def __open(self):
+        if self.compression is not None:
+            with open_text(self.path, self.compression) as f:
+                self.__buffer = f.buffer.read()
+        else:
+            self.__file = open(self.path, "rb")
+            if os.fstat(self.__file.fileno()).st_size == 0:
+                self.__buffer = b""  # an empty file can not be mapped
+            else:
+                self.__buffer = mmap.mmap(self.__file.fileno(),
+                                          0,
+                                          access=mmap.ACCESS_READ)
+
+    def size(self):
+        """size(self) -> int: the size of the file in bytes"""
+        if self.__buffer is None and self.compression is None:
+            return os.path.getsize(self.path)
+        return len(self.buffer())
+
+    def iter_chunks(self, chunk_size=1 << 20):
+        """iter_chunks(self, chunk_size=1 << 20) -> iterator of bytes: the content chunk by chunk"""
+        buf = self.buffer()
+        for i in range(0, len(buf), chunk_size):
+            yield buf[i:i + chunk_size]
+
+    def text(self):
+        """text(self) -> str: the whole content decoded with `encoding`"""
+        return bytes(self.buffer()).decode(self.encoding)
+
+    def close(self):
+        if isinstance(self.__buffer, mmap.mmap):
+            self.__buffer.close()
+        self.__buffer = None
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TextContent(str):
+    """
+    A str that can remember values computed from it in `cache`, like `FileContent`.
+    Compare uses it for the std output kept in memory, which is graded many times.
+    """
+
+    def __new__(cls, value=""):
+        self = super(TextContent, cls).__new__(cls, value)
+        self.cache = {}
+        return self
+
+
+def cached(content, name, func):
+    """cached(content, name, func) -> func(content), computed once for contents that have a `cache`"""
+    cache = getattr(content, "cache", None)
+    if cache is None:
+        return func(content)
+    if name not in cache:
+        cache[name] = func(content)
+    return cache[name]
+
+
+def as_text(content):
+    """as_text(content) -> str: the text of a str or a FileContent"""
+    if isinstance(content, FileContent):
+        return content.text()
+    return content
+
+
+def as_buffer(content):
+    """as_buffer(content) -> bytes-like: the UTF-8 bytes of a str or a FileContent"""
+    if isinstance(content, FileContent):
+        if content.is_utf8:
+            return content.buffer()
+        return content.text().encode("utf-8")
+    return content.encode("utf-8")
+
+
+def iter_bytes(content, chunk_size=1 << 20):
+    """iter_bytes(content, chunk_size=1 << 20) -> iterator of bytes: the UTF-8 in chunks"""
+    if isinstance(content, FileContent) and content.is_utf8:
+        for chunk in content.iter_chunks(chunk_size):
+            yield chunk
+    elif isinstance(content, FileContent):
+        for text in iter_text(content, chunk_size):
+            yield text.encode("utf-8")
+    else:
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size].encode("utf-8")
+
+
+def byte_size(content):
+    """byte_size(content) -> int: the size of the UTF-8 bytes of content"""
+    if isinstance(content, FileContent) and content.is_utf8:
+        return content.size()
+    return sum(len(chunk) for chunk in iter_bytes(content))
+
+
+def iter_text(content, chunk_size=1 << 20):
+    """iter_text(content, chunk_size=1 << 20) -> iterator of str: the text in chunks"""
+    if isinstance(content, FileContent):
+        decoder = codecs.getincrementaldecoder(content.encoding)()
+        for chunk in content.iter_chunks(chunk_size):
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+    else:
+        for i in range(0, len(content), chunk_size):
+            yield content[i:i + chunk_size]
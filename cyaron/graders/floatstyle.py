@@ -0,0 +1,141 @@
+import math
+import re
+from functools import partial
+from itertools import islice
+
+from .filecontent import as_buffer, as_text, cached
+from .graderregistry import CYaRonGraders
+from .mismatch import TextMismatch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_EPS = 1e-6
+
+_TOKEN = re.compile(rb"\S+")
+
+
+def _tokens(content):
+    """The whitespace separated tokens of content as a list of bytes."""
+    return bytes(as_buffer(content)).split()
+
+
+def _parse(tokens):
+    """
+    Parse all the tokens as floats, into a NumPy array if it is installed.
+    Returns:
+        the values, and the list of the tokens that are not numbers as None,
+        or None if every token is a number
+    """
+    if np is not None:
+        try:
+            return np.fromiter(map(float, tokens), np.float64,
+                               len(tokens)), None
+        except ValueError:
+            pass  # some tokens are words, parse them one by one
+    values = []
+    words = []
+    has_words = False
+    for token in tokens:
+        try:
+            values.append(float(token))
+            words.append(None)
+        except ValueError:
+            values.append(math.nan)
+            words.append(token)
+            has_words = True
+    if np is not None:
+        values = np.array(values, dtype=np.float64)
+    return values, (words if has_words else None)
+
+
+def _first_bad(content_values, std_values, abs_eps, rel_eps):
+    """The index of the first pair of numbers out of tolerance, or None."""
+    if np is not None:
+        with np.errstate(invalid="ignore", over="ignore"):
+            diff = np.abs(content_values - std_values)
+            ok = (diff <= abs_eps) | (diff <= rel_eps * np.abs(std_values))
+            ok &= np.isfinite(diff)  # an infinity is only close to itself
+            ok |= content_values == std_values
+            ok |= np.isnan(content_values) & np.isnan(std_values)
+        bad = np.flatnonzero(~ok)
+        return int(bad[0]) if bad.size else None
+    for i, (a, b) in enumerate(zip(content_values, std_values)):
+        if a == b or (math.isnan(a) and math.isnan(b)):
+            continue
+        diff = abs(a - b)
+        if math.isinf(diff) or not (diff <= abs_eps
+                                    or diff <= rel_eps * abs(b)):
+            return i
+    return None
+
+
+def _locate(content, index):
+    """Return the line and the column of the token `index` of content."""
+    data = bytes(as_buffer(content))
+    match = next(islice(_TOKEN.finditer(data), index, None))
+    start = match.start()
+    line_start = data.rfind(b"\n", 0, start) + 1
+    return data.count(b"\n", 0, start) + 1, start - line_start + 1
+
+
+@CYaRonGraders.grader("Float", file_content=True)
+def floatstyle(content, std, abs_eps=DEFAULT_EPS, rel_eps=DEFAULT_EPS):
+    """
+    Compare the whitespace separated tokens of content and std. Numbers are
+    accepted if the absolute or the relative error is at most the eps, like
+    the checkers of testlib, and other tokens must be equal.
+    The tokens are parsed in one pass and compared at once with NumPy if it is installed.
+    The parsed tokens of std are remembered across calls if it has a `cache`.
+    """
+    content_tokens = _tokens(content)
+    std_tokens = cached(std, "tokens", _tokens)
+    content_values, content_words = _parse(content_tokens)
+    std_values, std_words = cached(std, "floats",
+                                   lambda std: _parse(std_tokens))
+    k = min(len(content_tokens), len(std_tokens))
+
+    bad = None
+    if content_words is None and std_words is None:
+        bad = _first_bad(content_values[:k], std_values[:k], abs_eps, rel_eps)
+    else:
+        # compare the numbers between two words in bulk
+        word_ids = sorted(
+            set(i for words in (content_words, std_words) if words is not None
+                for i, word in enumerate(words[:k]) if word is not None))
+        i = 0
+        for j in word_ids + [k]:
+            bad = _first_bad(content_values[i:j], std_values[i:j], abs_eps,
+                             rel_eps)
+            if bad is not None:
+                bad += i
+                break
+            if j < k and content_tokens[j] != std_tokens[j]:
+                bad = j
+                break
+            i = j + 1
+
+    if bad is None:
+        if len(content_tokens) == len(std_tokens):
+            return True, None
+        return False, TextMismatch(as_text(content), as_text(std),
+                                   'Too many or too few tokens.')
+    lineno, colno = _locate(content, bad)
+    return False, TextMismatch(as_text(content), as_text(std),
+                               'On line {} column {}, read {}, expected {}.',
+                               lineno, colno,
+                               content_tokens[bad].decode("utf-8", "replace"),
+                               std_tokens[bad].decode("utf-8", "replace"))
+
+
+def float_grader(name, abs_eps=DEFAULT_EPS, rel_eps=DEFAULT_EPS):
+    """
+    float_grader(name, abs_eps=1e-6, rel_eps=1e-6) -> str: register the "Float"
+    grader with other tolerances as `name`, and return the name to pass to Compare
+    """
+    CYaRonGraders.grader(name, file_content=True)(partial(floatstyle,
+                                                          abs_eps=abs_eps,
+                                                          rel_eps=rel_eps))
+    return name
@@ -1,11 +1,66 @@
 import hashlib
+from .filecontent import as_buffer, as_text, byte_size, cached, iter_bytes
 from .graderregistry import CYaRonGraders
-from .mismatch import HashMismatch
+from .mismatch import HashMismatch, SizeMismatch
 
 
-@CYaRonGraders.grader("FullText")
+def _sha256(content):
+    digest = hashlib.sha256()
+    for chunk in iter_bytes(content):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@CYaRonGraders.grader("FullText", file_content=True)
 def fulltext(content, std):
-    content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
-    std_hash = hashlib.sha256(std.encode('utf-8')).hexdigest()
+    """
+    Compare the SHA-256 digests of content and std, hashed chunk by chunk.
+    Outputs of different sizes are rejected before hashing.
+    The size and the digest of std are remembered across calls if it has a `cache`.
+    """
+    content_size = byte_size(content)
+    std_size = cached(std, "size", byte_size)
+    if content_size != std_size:
+        return False, SizeMismatch(as_text(content), as_text(std),
+                                   content_size, std_size)
+    content_hash = _sha256(content)
+    std_hash = cached(std, "sha256", _sha256)
     return (True, None) if content_hash == std_hash else (
-        False, HashMismatch(content, std, content_hash, std_hash))
+        False,
+        HashMismatch(as_text(content), as_text(std), content_hash, std_hash))
+
+
+@CYaRonGraders.stream("FullText")
+class FullTextStream:
+    """
+    Compare the output of a running program with std byte by byte as it arrives.
+    A different byte, or more bytes than std, means the output can not be accepted.
+    """
+
+    def __init__(self, std):
+        self.std = std
+        self.std_bytes = cached(std, "bytes", as_buffer)
+        self.size = 0  # the number of bytes compared
+        self.mismatch = False
+
+    def feed(self, text):
+        """feed(self, text) -> bool: whether the output is certainly wrong"""
+        data = text.encode("utf-8")
+        end = self.size + len(data)
+        if end > len(self.std_bytes) or \
+                self.std_bytes[self.size:end] != data:
+            self.mismatch = True
+            return True
+        self.size = end
+        return False
+
+    def result(self, content):
+        """result(self, content) -> (bool, Mismatch): the verdict on the output read"""
+        if not self.mismatch:
+            if self.size == len(self.std_bytes):
+                return True, None  # every byte has been compared
+            return fulltext(content, self.std)
+        # the program was stopped, so hash the output read so far
+        return False, HashMismatch(content, as_text(self.std),
+                                   _sha256(content),
+                                   cached(self.std, "sha256", _sha256))
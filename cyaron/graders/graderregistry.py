@@ -1,19 +1,176 @@
+import hashlib
+import types
+from functools import partial
+
+from .checker import ExternalChecker
+from .filecontent import as_text
+
+
+def _hash_code(digest, code):
+    """Hash the bytecode of `code` with the constants and the names it uses."""
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode("utf-8"))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(digest, const)
+        elif isinstance(const, frozenset):
+            # the order of a set changes with the hash seed of the process
+            digest.update(repr(sorted(map(repr, const))).encode("utf-8"))
+        else:
+            digest.update(repr(const).encode("utf-8"))
+
+
+def _hash_callable(digest, func):
+    """Hash what a grader written in Python runs: its name, its code and its arguments."""
+    if isinstance(func, partial):
+        _hash_callable(digest, func.func)
+        digest.update(
+            repr((func.args, sorted(func.keywords.items()))).encode("utf-8"))
+        return
+    digest.update("{}.{}".format(
+        getattr(func, "__module__", None),
+        getattr(func, "__qualname__",
+                type(func).__qualname__)).encode("utf-8"))
+    if isinstance(func, types.FunctionType):
+        _hash_code(digest, func.__code__)
+        digest.update(
+            repr((func.__defaults__, func.__kwdefaults__)).encode("utf-8"))
+    elif isinstance(func, type):
+        # a streaming class, hashed method by method
+        for name, value in sorted(vars(func).items()):
+            if isinstance(value, types.FunctionType):
+                digest.update(name.encode("utf-8"))
+                _hash_callable(digest, value)
+
+
+class Grader:
+    """
+    A registered grader together with how it is called. Compare gives it to
+    the worker processes instead of the name, since a grader registered at runtime,
+    like an external checker, is not registered in a spawned process.
+    It can be pickled if the grader function and its streaming class can.
+    """
+
+    def __init__(self, name, func, file_content, with_input, stream=None):
+        self.name = name
+        self.func = func
+        self.file_content = file_content
+        self.with_input = with_input
+        self.stream = stream
+
+    def __repr__(self):
+        return "Grader(%r)" % (self.name, )
+
+    def __call__(self, content, std, input=None):
+        """__call__(self, content, std, input=None) -> (bool, Mismatch): the verdict"""
+        if not self.file_content:
+            content, std = as_text(content), as_text(std)
+        if self.with_input:
+            return self.func(content, std, input=input)
+        return self.func(content, std)
+
+    def open_stream(self, std):
+        """open_stream(self, std) -> the streaming checker for std, or None if it has none"""
+        if self.stream is None:
+            return None
+        return self.stream(std)
+
+    def fingerprint(self):
+        """
+        fingerprint(self) -> str: the hash of what the grader runs, so that its verdicts
+        can be cached. It is the binary of an external checker, and the code and the
+        arguments, like the eps of `float_grader`, of a grader written in Python.
+        """
+        fingerprint = getattr(self.func, "fingerprint", None)
+        if fingerprint is not None:
+            return fingerprint()
+        digest = hashlib.sha256()
+        digest.update(
+            repr((self.file_content, self.with_input)).encode("utf-8"))
+        _hash_callable(digest, self.func)
+        if self.stream is not None:
+            _hash_callable(digest, self.stream)
+        return digest.hexdigest()
+
+
 class GraderRegistry:
     _registry = dict()
+    _file_content = set()
+    _with_input = set()
+    _streams = dict()
 
-    def grader(self, name):
+    def grader(self, name, file_content=False, with_input=False):
+        """
+        name -> the name of the grader
+        file_content -> set to True if the grader accepts `FileContent` as well as str,
+            otherwise the content of files is read into str before calling it
+        with_input -> set to True if the grader also looks at the input, which is
+            passed as `input=`, a `FileContent` of the input file or None
+        """
 
         def wrapper(func):
             self._registry[name] = func
+            for flag, names in ((file_content, self._file_content),
+                                (with_input, self._with_input)):
+                if flag:
+                    names.add(name)
+                else:
+                    names.discard(name)
             return func
 
         return wrapper
 
-    def invoke(self, name, content, std):
-        return self._registry[name](content, std)
+    def checker(self, name, command, timeout=None):
+        """
+        name -> the name of the grader
+        command -> a testlib-style checker, a str run by the shell or a list of
+            arguments, called with the paths of the input, the output and the answer
+        timeout -> the time limit (seconds) of the checker, None means no limit
+        Register an external checker as a grader. The files written by `IO`
+        are given to it directly, and other contents are written into temp files.
+        """
+        self.grader(name, file_content=True,
+                    with_input=True)(ExternalChecker(command, timeout))
+        return name
+
+    def stream(self, name):
+        """
+        name -> the name of the grader
+        Register a class that checks the output of a running program for the grader.
+        It is created with std, then `feed(text)` is called with every piece of the
+        output and returns True once the output can not be accepted any more.
+        `result(content)` gives the verdict on the output read, like the grader.
+        """
+
+        def wrapper(cls):
+            self._streams[name] = cls
+            return cls
+
+        return wrapper
+
+    def get(self, name):
+        """get(self, name) -> Grader: the grader registered as `name`"""
+        return Grader(name, self._registry[name], name in self._file_content,
+                      name in self._with_input, self._streams.get(name))
+
+    def open_stream(self, name, std):
+        """Create the streaming checker of the grader for std, or None if it has none."""
+        if name not in self._streams:
+            return None
+        return self._streams[name](std)
+
+    def invoke(self, name, content, std, input=None):
+        return self.get(name)(content, std, input)
+
+    def fingerprint(self, name):
+        """The hash of what the grader runs, so that its verdicts can be cached."""
+        return self.get(name).fingerprint()
 
     def check(self, name):
         return name in self._registry
 
+    def check_stream(self, name):
+        return name in self._streams
+
 
 CYaRonGraders = GraderRegistry()
@@ -1,3 +1,6 @@
+import hashlib
+
+
 class Mismatch(ValueError):
     """exception for content mismatch"""
 
@@ -31,6 +34,72 @@ class HashMismatch(Mismatch):
                                                         self.std_hash)
 
 
+class SizeMismatch(HashMismatch):
+    """
+    exception for hash mismatch found by the sizes, before hashing.
+    The hashes are only computed if they are asked for, like by `str()`.
+    """
+
+    def __init__(self, content, std, content_size, std_size):
+        """
+        content -> content got
+        std -> content expected
+        content_size -> size of content in bytes
+        std_size -> size of std in bytes
+        """
+        Mismatch.__init__(self, content, std, content_size, std_size)
+        self.content_size = content_size
+        self.std_size = std_size
+
+    @property
+    def content_hash(self):
+        return hashlib.sha256(self.content.encode("utf-8")).hexdigest()
+
+    @property
+    def std_hash(self):
+        return hashlib.sha256(self.std.encode("utf-8")).hexdigest()
+
+
+class CachedMismatch(Mismatch):
+    """exception for a mismatch loaded from a `ResultCache`, which only keeps its message"""
+
+    def __init__(self, message):
+        """
+        message -> the message of the original mismatch
+        """
+        super(CachedMismatch, self).__init__(None, None, message)
+        self.args = (message, )
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class CheckerMismatch(Mismatch):
+    """exception for the output rejected by an external checker"""
+
+    def __init__(self, content, std, verdict, message, returncode):
+        """
+        content -> content got
+        std -> content expected
+        verdict -> the verdict given by the exit code, like "wrong answer"
+        message -> what the checker wrote to stderr
+        returncode -> the exit code of the checker
+        """
+        super(CheckerMismatch, self).__init__(content, std, verdict, message,
+                                              returncode)
+        self.verdict = verdict
+        self.message = message
+        self.returncode = returncode
+
+    def __str__(self):
+        # testlib messages start with the verdict already
+        if self.message.startswith(self.verdict):
+            return self.message
+        return "%s: %s" % (self.verdict, self.message) if self.message \
+            else self.verdict
+
+
 class TextMismatch(Mismatch):
     """exception for text mismatch"""
 
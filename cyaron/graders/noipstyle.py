@@ -1,34 +1,165 @@
-from ..utils import *
+from .filecontent import as_text, iter_text
 from .graderregistry import CYaRonGraders
 from .mismatch import TextMismatch
 
 
-@CYaRonGraders.grader("NOIPStyle")
-def noipstyle(content, std):
-    content_lines = strtolines(content.replace('\r\n', '\n'))
-    std_lines = strtolines(std.replace('\r\n', '\n'))
-    if len(content_lines) != len(std_lines):
-        return False, TextMismatch(content, std, 'Too many or too few lines.')
-
-    for i in range(len(content_lines)):
-        if std_lines[i] != content_lines[i]:
-            for j in range(min(len(std_lines[i]), len(content_lines[i]))):
-                if std_lines[i][j] != content_lines[i][j]:
-                    return (False,
-                            TextMismatch(
-                                content, std,
-                                'On line {} column {}, read {}, expected {}.',
-                                i + 1, j + 1, content_lines[i][j:j + 5],
-                                std_lines[i][j:j + 5]))
-            if len(std_lines[i]) > len(content_lines[i]):
-                return False, TextMismatch(content, std,
-                                           'Too short on line {}.', i + 1,
-                                           j + 1, content_lines[i][j:j + 5],
-                                           std_lines[i][j:j + 5])
-            if len(std_lines[i]) < len(content_lines[i]):
-                return False, TextMismatch(content, std,
-                                           'Too long on line {}.', i + 1,
-                                           j + 1, content_lines[i][j:j + 5],
-                                           std_lines[i][j:j + 5])
-
-    return True, None
+class _LineReader:
+    """
+    Read the lines of a str or a FileContent block by block.
+    The lines keep their trailing spaces; compare them after rstrip().
+    """
+
+    def __init__(self, content, chunk_size):
+        self.chunks = iter_text(content, chunk_size)
+        self.pending = ""
+        self.done = False
+        self.lines = []
+        self.pos = 0  # the index of the next line in self.lines
+        self.offset = 0  # the number of lines before self.lines
+        self.last = 0  # the number of lines up to the last non-blank one
+
+    def available(self):
+        """Return the number of unread lines, reading another block if needed."""
+        while self.pos == len(self.lines) and not self.done:
+            self.offset += len(self.lines)
+            self.pos = 0
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.done = True
+                self.lines = [self.pending]
+            else:
+                self.lines = (self.pending + chunk).split("\n")
+                self.pending = self.lines.pop()
+            for i in range(len(self.lines) - 1, -1, -1):
+                if self.lines[i].strip():
+                    self.last = self.offset + i + 1
+                    break
+        return len(self.lines) - self.pos
+
+    def count(self):
+        """Read to the end and return the number of lines without the blank ones at the end."""
+        while True:
+            self.pos = len(self.lines)
+            if not self.available():
+                return self.last
+
+
+@CYaRonGraders.grader("NOIPStyle", file_content=True)
+def noipstyle(content, std, chunk_size=1 << 20):
+    """
+    Compare the lines of content and std, ignoring the spaces at the end of
+    every line and the blank lines at the end.
+    Both are read chunk by chunk, and equal lines are compared in blocks.
+    """
+    content_reader = _LineReader(content, chunk_size)
+    std_reader = _LineReader(std, chunk_size)
+    mismatch = None
+    while True:
+        k = min(content_reader.available(), std_reader.available())
+        if k == 0:
+            break
+        start = content_reader.pos
+        content_lines = content_reader.lines[start:start + k]
+        std_lines = std_reader.lines[std_reader.pos:std_reader.pos + k]
+        if content_lines != std_lines:
+            for i in range(k):
+                content_line = content_lines[i].rstrip()
+                std_line = std_lines[i].rstrip()
+                if content_line != std_line:
+                    mismatch = (content_reader.offset + start + i,
+                                content_line, std_line)
+                    break
+            if mismatch is not None:
+                break
+        content_reader.pos += k
+        std_reader.pos += k
+
+    # like comparing the number of lines first, then the lines one by one
+    if content_reader.count() != std_reader.count():
+        return False, TextMismatch(as_text(content), as_text(std),
+                                   'Too many or too few lines.')
+    if mismatch is None:
+        return True, None
+
+    return _line_mismatch(content, std, *mismatch)
+
+
+def _line_mismatch(content, std, i, content_line, std_line):
+    """Describe the difference between the stripped lines on line i + 1."""
+    for j in range(min(len(std_line), len(content_line))):
+        if std_line[j] != content_line[j]:
+            return (False,
+                    TextMismatch(
+                        as_text(content), as_text(std),
+                        'On line {} column {}, read {}, expected {}.', i + 1,
+                        j + 1, content_line[j:j + 5], std_line[j:j + 5]))
+    j = max(min(len(std_line), len(content_line)) - 1, 0)
+    if len(std_line) > len(content_line):
+        return False, TextMismatch(as_text(content), as_text(std),
+                                   'Too short on line {}.', i + 1, j + 1,
+                                   content_line[j:j + 5], std_line[j:j + 5])
+    return False, TextMismatch(as_text(content), as_text(std),
+                               'Too long on line {}.', i + 1, j + 1,
+                               content_line[j:j + 5], std_line[j:j + 5])
+
+
+@CYaRonGraders.stream("NOIPStyle")
+class NOIPStyleStream:
+    """
+    Compare the output of a running program with std line by line as it arrives.
+    A line that differs from std, or a non-blank line after the end of std,
+    means the output can not be accepted any more.
+    """
+
+    def __init__(self, std, chunk_size=1 << 20):
+        self.std = std
+        self.std_reader = _LineReader(std, chunk_size)
+        self.pending = ""
+        self.lineno = 0  # the number of complete lines compared
+        self.mismatch = None
+
+    def feed(self, text):
+        """feed(self, text) -> bool: whether the output is certainly wrong"""
+        lines = (self.pending + text).split("\n")
+        self.pending = lines.pop()
+        std_reader = self.std_reader
+        pos = 0
+        while pos < len(lines):
+            k = min(len(lines) - pos, std_reader.available())
+            if k == 0:
+                # std has ended, so only blank lines may follow
+                for line in lines[pos:]:
+                    if line.strip():
+                        self.mismatch = ()
+                        return True
+                    self.lineno += 1
+                return False
+            content_lines = lines[pos:pos + k]
+            std_lines = std_reader.lines[std_reader.pos:std_reader.pos + k]
+            if content_lines != std_lines:
+                for i in range(k):
+                    content_line = content_lines[i].rstrip()
+                    std_line = std_lines[i].rstrip()
+                    if content_line != std_line:
+                        self.mismatch = (self.lineno + i, content_line,
+                                         std_line)
+                        return True
+            pos += k
+            std_reader.pos += k
+            self.lineno += k
+        return False
+
+    def result(self, content):
+        """result(self, content) -> (bool, Mismatch): the verdict on the output read"""
+        if self.mismatch is None:
+            # the output has ended, so the last line is complete
+            if self.feed("\n"):
+                return noipstyle(content, self.std)
+            if self.std_reader.count() > self.lineno:
+                return False, TextMismatch(content, as_text(self.std),
+                                           'Too many or too few lines.')
+            return True, None
+        if not self.mismatch:
+            return False, TextMismatch(content, as_text(self.std),
+                                       'Too many or too few lines.')
+        return _line_mismatch(content, self.std, *self.mismatch)
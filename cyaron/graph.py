@@ -1,17 +1,25 @@
 import itertools
 import math
 import random
+from array import array
 from typing import (Callable, Counter, Iterable, List, Optional, Sequence,
                     Tuple, TypeVar, Union, cast)
 
 from .utils import *
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 __all__ = ["Edge", "Graph", "SwitchGraph"]
 
 
 class Edge:
     """Class Edge: A class of the edge in the graph"""
 
+    __slots__ = ("start", "end", "weight")
+
     def __init__(self, u, v, w):
         """__init__(self, u, v, w) -> None
             Initialize a edge. 
@@ -37,6 +45,19 @@ class Edge:
         return '%d %d' % (edge.start, edge.end)
 
 
+def _edge_format(output):
+    """
+    The %-format of the edges written by output, if it is one of the
+    formatters of Edge, so that all the edges can be formatted in one pass.
+    Returns None for other callables.
+    """
+    if output is str or output is Edge.__str__:
+        return "%d %d %d"
+    if output is Edge.unweighted_edge:
+        return "%d %d"
+    return None
+
+
 class SwitchGraph:
     """A graph which can switch edges quickly"""
 
@@ -243,24 +264,229 @@ class SwitchGraph:
         return self.__edges.elements()
 
 
+def _take(column, ids):
+    """The elements of column at ids, a slice or an array of indices, as a list."""
+    if isinstance(ids, slice):
+        part = column[ids]
+        return part if isinstance(part, list) else part.tolist()
+    if np is not None and isinstance(column, np.ndarray):
+        return column[np.asarray(ids)].tolist()
+    if np is not None and isinstance(ids, np.ndarray):
+        ids = ids.tolist()
+    return [column[i] for i in ids]
+
+
+def _gather(column, ids):
+    """The elements of column at ids as a NumPy array."""
+    if isinstance(column, np.ndarray):
+        return column[ids]
+    return np.asarray(_take(column, ids), dtype=np.int64)
+
+
+def _shuffle_plan(point_count, edge_count, directed, seed):
+    """
+    Draw the new vertex ids, the order of the edges and the edges to flip of
+    a shuffle at once. They only depend on seed, so the same seed gives the
+    same shuffle with or without NumPy, which is only used to apply it.
+    Args:
+        point_count: the count of the vertexes
+        edge_count: the count of the edges
+        directed: whether the graph is directed, then no edge is flipped
+        seed: a str or an int, or None to take it from the global random state
+    Returns:
+        (new_node_id, order, flips), where new_node_id[0] is 0,
+        as NumPy arrays if it is installed
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    rng = random.Random(seed)
+    new_node_id = list(range(1, point_count + 1))
+    rng.shuffle(new_node_id)
+    new_node_id = array("l", [0] + new_node_id)
+    order = array("l", range(edge_count))
+    rng.shuffle(order)
+    if directed or edge_count == 0:
+        flips = bytes(edge_count)
+    else:
+        # one random bit per edge, as the bytes 0 and 1
+        bits = format(rng.getrandbits(edge_count), "0%db" % edge_count)
+        flips = bits.encode().translate(bytes.maketrans(b"01", b"\0\1"))
+    if np is not None:
+        new_node_id = np.asarray(new_node_id, dtype=np.int64)
+        order = np.asarray(order, dtype=np.int64)
+        flips = np.frombuffer(flips, dtype=np.bool_)
+    return new_node_id, order, flips
+
+
+def _relabel(new_node_id, starts, ends, ids, flips):
+    """
+    The starts and the ends of the edges at ids, mapped by new_node_id and
+    swapped where flips is true, as lists.
+    """
+    if np is not None and isinstance(new_node_id, np.ndarray):
+        u = new_node_id[_gather(starts, ids)]
+        v = new_node_id[_gather(ends, ids)]
+        return np.where(flips, v, u).tolist(), np.where(flips, u, v).tolist()
+    u = [new_node_id[x] for x in _take(starts, ids)]
+    v = [new_node_id[x] for x in _take(ends, ids)]
+    for k, flip in enumerate(flips):
+        if flip:
+            u[k], v[k] = v[k], u[k]
+    return u, v
+
+
+def _format_edges(edge_format, output, starts, ends, weights):
+    """
+    The lines of the edges given by columns, by one pass of edge_format,
+    or by calling output on every Edge if edge_format is None.
+    """
+    if edge_format is None:
+        return [output(Edge(*edge)) for edge in zip(starts, ends, weights)]
+    if edge_format == "%d %d":
+        return list(map(edge_format.__mod__, zip(starts, ends)))
+    return list(map(edge_format.__mod__, zip(starts, ends, weights)))
+
+
+class _CompactAdjacency:
+    """
+    The adjacency lists of a compact Graph, in the same order as `Graph.edges`
+    of a normal Graph. They are built from a CSR index on first use, and the
+    `Edge` objects of a vertex are created when its list is read.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return self.graph._point_count + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("vertex out of range")
+        return list(self.graph._iterate_vertex(index))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
 class Graph:
     """Class Graph: A class of the graph
     """
 
-    def __init__(self, point_count, directed=False):
+    ITER_CHUNK_SIZE = 1 << 14
+    """How many edges are formatted at a time by `iter_lines` and `write_to`."""
+
+    def __init__(self, point_count, directed=False, compact=False):
         """__init__(self, point_count) -> None
             Initialize a graph.
             int point_count -> the count of the vertexes in the graph.
             bool directed = False -> whether the graph is directed(true:directed,false:not directed)
+            bool compact = False -> keep the edges in arrays of starts, ends and weights,
+                every edge once, instead of Edge objects in adjacency lists.
+                It takes about a tenth of the memory. `edges` is then a read-only view
+                that builds the adjacency lists from an index made on first use.
         """
         self.directed = directed
-        self.edges = [[] for i in range(point_count + 1)]
+        self.compact = compact
+        self._point_count = point_count
+        self._edge_count = 0
+        self._in_degree = array("l", [0]) * (point_count + 1)
+        self._out_degree = array("l", [0]) * (point_count + 1)
+        if compact:
+            self._starts = array("i")
+            self._ends = array("i")
+            self._weights = array("q")
+            self.__index = None
+            self.edges = _CompactAdjacency(self)
+        else:
+            self.edges = [[] for i in range(point_count + 1)]
 
     def edge_count(self):
         """edge_count(self) -> int
             Return the count of the edges in the graph.
         """
-        return len(list(self.iterate_edges()))
+        return self._edge_count
+
+    def degree(self, v):
+        """degree(self, v) -> int
+            Return the count of the edges at vertex v. A self loop counts twice.
+            int v -> the vertex
+        """
+        return self._in_degree[v] + self._out_degree[v]
+
+    def in_degree(self, v):
+        """in_degree(self, v) -> int
+            Return the count of the edges ending at vertex v of a directed graph.
+            int v -> the vertex
+        """
+        return self._in_degree[v]
+
+    def out_degree(self, v):
+        """out_degree(self, v) -> int
+            Return the count of the edges starting at vertex v of a directed graph.
+            int v -> the vertex
+        """
+        return self._out_degree[v]
+
+    def _iterate_vertex(self, v, forward_only=False):
+        """Yield the edges in the adjacency list of v of a compact graph."""
+        offsets, targets, edge_ids = self._csr()
+        a, b = int(offsets[v]), int(offsets[v + 1])
+        weights = self._weights
+        for u, i in zip(targets[a:b].tolist(), edge_ids[a:b].tolist()):
+            if not forward_only or u >= v:
+                yield Edge(v, u, weights[i])
+
+    def _csr(self):
+        """_csr(self) -> (offsets, targets, edge_ids)
+            The CSR index of a compact graph: the half edges of vertex v are
+            targets[offsets[v]:offsets[v + 1]], the ends of the edges edge_ids[...].
+        """
+        if self.__index is not None:
+            return self.__index
+        n = self._point_count + 1
+        starts, ends = self._starts, self._ends
+        if np is not None:
+            starts = np.frombuffer(starts, dtype=np.intc)
+            ends = np.frombuffer(ends, dtype=np.intc)
+            ids = np.arange(len(starts), dtype=np.intc)
+            if not self.directed:
+                back = starts != ends  # a self loop is in the list once
+                ids = np.concatenate((ids, ids[back]))
+                sources = np.concatenate((starts, ends[back]))
+                ends = np.concatenate((ends, starts[back]))
+                starts = sources
+            order = np.lexsort((ids, starts))
+            offsets = np.zeros(n + 1, dtype=np.intp)
+            np.cumsum(np.bincount(starts, minlength=n), out=offsets[1:])
+            self.__index = (offsets, ends[order], ids[order])
+            return self.__index
+
+        offsets = array("l", [0] * (n + 1))
+        for u, v in zip(starts, ends):
+            offsets[u + 1] += 1
+            if not self.directed and u != v:
+                offsets[v + 1] += 1
+        for v in range(n):
+            offsets[v + 1] += offsets[v]
+        pos = array("l", offsets)
+        targets = array("i", [0]) * offsets[n]
+        edge_ids = array("l", [0]) * offsets[n]
+        for i, (u, v) in enumerate(zip(starts, ends)):
+            targets[pos[u]] = v
+            edge_ids[pos[u]] = i
+            pos[u] += 1
+            if not self.directed and u != v:
+                targets[pos[v]] = u
+                edge_ids[pos[v]] = i
+                pos[v] += 1
+        self.__index = (offsets, targets, edge_ids)
+        return self.__index
 
     def to_matrix(self, **kwargs):
         """to_matrix(self, **kwargs) -> GraphMatrix
@@ -278,29 +504,133 @@ class Graph:
             Convert the graph to string with format. Splits with "\n"
             **kwargs(Keyword args):
                 bool shuffle = False -> whether shuffle the output or not
+                str/int seed = None -> if not None, draw the shuffle from this seed at once, see `anonymize`
+                str output(Edge) = str -> the convert function which converts object Edge to str. the default way is to use str()
+        """
+        return "\n".join(map("\n".join, self.__iter_chunks(**kwargs)))
+
+    def iter_lines(self, **kwargs):
+        """iter_lines(self, **kwargs) -> Iterator[str]
+            Yield the lines of `to_str` one by one, formatting ITER_CHUNK_SIZE edges at a time.
+            The random numbers of shuffle are all drawn before the first line.
+            **kwargs(Keyword args):
+                bool shuffle = False -> whether shuffle the output or not
+                str/int seed = None -> if not None, draw the shuffle from this seed at once, see `anonymize`
+                str output(Edge) = str -> the convert function which converts object Edge to str. the default way is to use str()
+        """
+        for lines in self.__iter_chunks(**kwargs):
+            yield from lines
+
+    def write_to(self, io, **kwargs):
+        """write_to(self, io, **kwargs) -> None
+            Write the graph into the input file of io, like `io.input_writeln(graph.to_str(**kwargs))`,
+            but ITER_CHUNK_SIZE edges at a time, without building the whole string.
+            IO io -> the IO object to write into
+            **kwargs(Keyword args):
+                bool shuffle = False -> whether shuffle the output or not
+                str/int seed = None -> if not None, draw the shuffle from this seed at once, see `anonymize`
                 str output(Edge) = str -> the convert function which converts object Edge to str. the default way is to use str()
         """
-        shuffle = kwargs.get("shuffle", False)
-        output = kwargs.get("output", str)
-        buf = []
-        if shuffle:
+        empty = True
+        for lines in self.__iter_chunks(**kwargs):
+            io.input_write("\n".join(lines), "\n")
+            empty = False
+        if empty:
+            io.input_writeln("")
+
+    def __iter_chunks(self, shuffle=False, output=str, seed=None):
+        """Yield the lines of the output in lists of at most ITER_CHUNK_SIZE lines."""
+        size = self.ITER_CHUNK_SIZE
+        edge_format = _edge_format(output)
+        if not shuffle and not self.compact:
+            edges = self.iterate_edges()
+            while True:
+                chunk = list(itertools.islice(edges, size))
+                if not chunk:
+                    return
+                if edge_format is None:
+                    yield list(map(output, chunk))
+                else:
+                    yield _format_edges(edge_format, output,
+                                        [edge.start for edge in chunk],
+                                        [edge.end for edge in chunk],
+                                        [edge.weight for edge in chunk])
+
+        starts, ends, weights = self._edge_columns()
+        if shuffle and seed is not None:
+            new_node_id, order, flips = _shuffle_plan(self._point_count,
+                                                      len(starts),
+                                                      self.directed, seed)
+        elif shuffle:
+            # one random call at a time, the same as the earlier versions
             new_node_id = [i for i in range(1, len(self.edges))]
             random.shuffle(new_node_id)
             new_node_id = [0] + new_node_id
-            edge_buf = []
-            for edge in self.iterate_edges():
-                edge_buf.append(
-                    Edge(new_node_id[edge.start], new_node_id[edge.end],
-                         edge.weight))
-            random.shuffle(edge_buf)
-            for edge in edge_buf:
-                if not self.directed and random.randint(0, 1) == 0:
-                    (edge.start, edge.end) = (edge.end, edge.start)
-                buf.append(output(edge))
-        else:
-            for edge in self.iterate_edges():
-                buf.append(output(edge))
-        return "\n".join(buf)
+            order = array("l", range(len(starts)))
+            random.shuffle(order)
+            if self.directed:
+                flips = bytes(len(order))
+            else:
+                flips = bytes(
+                    random.randint(0, 1) == 0 for _ in range(len(order)))
+        for i in range(0, len(starts), size):
+            chunk = slice(i, i + size)
+            if shuffle:
+                ids = order[chunk]
+                u, v = _relabel(new_node_id, starts, ends, ids, flips[chunk])
+            else:
+                ids = chunk
+                u, v = _take(starts, ids), _take(ends, ids)
+            yield _format_edges(edge_format, output, u, v, _take(weights, ids))
+
+    def anonymize(self, seed=None):
+        """anonymize(self, seed=None) -> Graph
+            Return a copy of the graph with the vertexes relabelled by a random permutation,
+            the edges added in a random order and the undirected edges in random directions.
+            Everything is drawn at once, like `to_str(shuffle=True, seed=seed)`.
+            str/int seed = None -> the seed of the shuffle. None means to take it from the global random state
+        """
+        starts, ends, weights = self._edge_columns()
+        new_node_id, order, flips = _shuffle_plan(self._point_count,
+                                                  len(starts), self.directed,
+                                                  seed)
+        u, v = _relabel(new_node_id, starts, ends, order, flips)
+        graph = Graph(self._point_count, self.directed, self.compact)
+        graph._extend_edges(u, v, _take(weights, order))
+        return graph
+
+    def _edge_columns(self):
+        """_edge_columns(self) -> (list, list, list)
+            The starts, the ends and the weights of the edges, in the order of `iterate_edges`.
+            The columns of a compact graph are NumPy arrays if it is installed.
+        """
+        if not self.compact:
+            edges = list(self.iterate_edges())
+            starts = [edge.start for edge in edges]
+            ends = [edge.end for edge in edges]
+            return starts, ends, [edge.weight for edge in edges]
+        offsets, targets, edge_ids = self._csr()
+        weights = self._weights
+        if np is not None:
+            n = len(offsets) - 1
+            sources = np.repeat(np.arange(n, dtype=np.intc), np.diff(offsets))
+            if not self.directed:
+                forward = targets >= sources
+                sources, targets = sources[forward], targets[forward]
+                edge_ids = edge_ids[forward]
+            if isinstance(weights, array):
+                weights = np.frombuffer(weights, dtype=np.int64)[edge_ids]
+            else:
+                weights = [weights[i] for i in edge_ids.tolist()]
+            return sources, targets, weights
+        starts, ends, edge_weights = [], [], []
+        for v in range(len(offsets) - 1):
+            for i in range(offsets[v], offsets[v + 1]):
+                if self.directed or targets[i] >= v:
+                    starts.append(v)
+                    ends.append(targets[i])
+                    edge_weights.append(weights[edge_ids[i]])
+        return starts, ends, edge_weights
 
     def __str__(self):
         """__str__(self) -> str
@@ -312,6 +642,10 @@ class Graph:
         """iterate_edges(self) -> Edge
             Iter the graph. Order by the start vertex.
         """
+        if self.compact:
+            for v in range(self._point_count + 1):
+                yield from self._iterate_vertex(v, not self.directed)
+            return
         for node in self.edges:
             for edge in node:
                 if edge.end >= edge.start or self.directed:
@@ -331,9 +665,61 @@ class Graph:
                 int weight = 1 -> the weight 
         """
         weight = kwargs.get("weight", 1)
-        self.__add_edge(x, y, weight)
-        if not self.directed and x != y:
-            self.__add_edge(y, x, weight)
+        if self.compact:
+            if not (0 <= x <= self._point_count
+                    and 0 <= y <= self._point_count):
+                raise IndexError("vertex out of range")
+            try:
+                self._weights.append(weight)
+            except (TypeError, OverflowError):
+                # weights that are not 64-bit ints are kept in a list
+                self._weights = list(self._weights)
+                self._weights.append(weight)
+            self._starts.append(x)
+            self._ends.append(y)
+            self.__index = None
+        else:
+            self.__add_edge(x, y, weight)
+            if not self.directed and x != y:
+                self.__add_edge(y, x, weight)
+        self._out_degree[x] += 1
+        self._in_degree[y] += 1
+        self._edge_count += 1
+
+    def _extend_edges(self, starts, ends, weights):
+        """_extend_edges(self, starts, ends, weights) -> None
+            Add the edges given by lists of starts, ends and weights in bulk.
+        """
+        if not starts:
+            return
+        if (min(min(starts), min(ends)) < 0
+                or max(max(starts), max(ends)) > self._point_count):
+            raise IndexError("vertex out of range")
+        if self.compact:
+            try:
+                self._weights.extend(array("q", weights))
+            except (TypeError, OverflowError):
+                self._weights = list(self._weights)
+                self._weights.extend(weights)
+            self._starts.extend(starts)
+            self._ends.extend(ends)
+            self.__index = None
+        else:
+            edges = self.edges
+            for x, y, w in zip(starts, ends, weights):
+                edges[x].append(Edge(x, y, w))
+                if not self.directed and x != y:
+                    edges[y].append(Edge(y, x, w))
+        degrees = ((self._out_degree, starts), (self._in_degree, ends))
+        for degree, vertexes in degrees:
+            if np is None:
+                for v in vertexes:
+                    degree[v] += 1
+                continue
+            counts = np.bincount(vertexes, minlength=len(degree))
+            for v in np.flatnonzero(counts).tolist():
+                degree[v] += int(counts[v])
+        self._edge_count += len(starts)
 
     @staticmethod
     def chain(point_count, **kwargs):
@@ -375,6 +761,7 @@ class Graph:
                NOTICE:only either chain or flower can be True
                **kwargs(Keyword args):
                    bool directed = False -> whether the chain is directed(true:directed,false:not directed)
+                   bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                    (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                    int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                    int/float weight_gen() 
@@ -398,7 +785,7 @@ class Graph:
             raise Exception("chain and flower must be between 0 and 1")
         if chain + flower > 1:
             raise Exception("chain plus flower must be smaller than 1")
-        graph = Graph(point_count, directed)
+        graph = Graph(point_count, directed, kwargs.get("compact", False))
 
         chain_count = int((point_count - 1) * chain)
         flower_count = int((point_count - 1) * flower)
@@ -428,6 +815,7 @@ class Graph:
                NOTICE:left+right mustn't be greater than 1
                **kwargs(Keyword args):
                    bool directed = False -> whether the binary tree is directed(true:directed,false:not directed)
+                   bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                    (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                    int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                    int/float weight_gen() 
@@ -449,7 +837,7 @@ class Graph:
 
         can_left = [1]
         can_right = [1]
-        graph = Graph(point_count, directed)
+        graph = Graph(point_count, directed, kwargs.get("compact", False))
         for i in range(2, point_count + 1):
             edge_pos = random.random()
             node = 0
@@ -488,6 +876,7 @@ class Graph:
                    bool self_loop = True -> whether to allow self loops or not
                    bool repeated_edges = True -> whether to allow repeated edges or not
                    bool directed = False -> whether the chain is directed(true:directed,false:not directed)
+                   bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                    (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                    int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                    int/float weight_gen() 
@@ -510,7 +899,7 @@ class Graph:
         weight_gen = kwargs.get(
             "weight_gen",
             lambda: random.randint(weight_limit[0], weight_limit[1]))
-        graph = Graph(point_count, directed)
+        graph = Graph(point_count, directed, kwargs.get("compact", False))
         used_edges = set()
         i = 0
         while i < edge_count:
@@ -542,9 +931,10 @@ class Graph:
                              weight_limit: Union[int, Tuple[int,
                                                             int]] = (1, 1),
                              weight_gen: Optional[Callable[[], int]] = None,
-                             iter_limit: int = int(1e6)):
+                             iter_limit: int = int(1e6),
+                             compact: bool = False):
         if len(degree_sequence) == 0:
-            return Graph(0)
+            return Graph(0, compact=compact)
         if isinstance(weight_limit, int):
             weight_limit = (1, weight_limit)
         if weight_gen is None:
@@ -577,7 +967,7 @@ class Graph:
         n_iter = min(n_iter, iter_limit)
         for _ in range(n_iter):
             sg.switch(self_loop=self_loop, repeated_edges=repeated_edges)
-        g = Graph(len(degree_sequence), directed)
+        g = Graph(len(degree_sequence), directed, compact)
         for edge in sg.get_edges():
             g.add_edge(*edge, weight=weight_gen())
         return g
@@ -592,6 +982,7 @@ class Graph:
                    bool self_loop = False -> whether to allow self loops or not
                    bool repeated_edges = True -> whether to allow repeated edges or not
                    bool loop = False -> whether to allow loops or not
+                   bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                    (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                    int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                    int/float weight_gen() 
@@ -623,7 +1014,9 @@ class Graph:
         used_edges = set()
         edge_buf = list(
             Graph.tree(point_count, weight_gen=weight_gen).iterate_edges())
-        graph = Graph(point_count, directed=True)
+        graph = Graph(point_count,
+                      directed=True,
+                      compact=kwargs.get("compact", False))
 
         for edge in edge_buf:
             if loop and random.randint(1, 2) == 1:
@@ -664,6 +1057,7 @@ class Graph:
                **kwargs(Keyword args):
                    bool self_loop = True -> whether to allow self loops or not
                    bool repeated_edges = True -> whether to allow repeated edges or not
+                   bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                    (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                    int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                    int/float weight_gen() 
@@ -692,7 +1086,10 @@ class Graph:
             lambda: random.randint(weight_limit[0], weight_limit[1]))
 
         used_edges = set()
-        graph = Graph.tree(point_count, weight_gen=weight_gen, directed=False)
+        graph = Graph.tree(point_count,
+                           weight_gen=weight_gen,
+                           directed=False,
+                           compact=kwargs.get("compact", False))
 
         for edge in graph.iterate_edges():
             if not repeated_edges:
@@ -738,6 +1135,7 @@ class Graph:
            int point_count -> the count of vertexes
            **kwargs(Keyword args):
                bool directed = False -> whether the chain is directed(true:directed,false:not directed)
+               bool compact = False -> whether to keep the edges in arrays, see `Graph.__init__`
                (int,int) weight_limit = (1,1) -> the limit of weight. index 0 is the min limit, and index 1 is the max limit(both included)
                int weight_limit -> If you use a int for this arg, it means the max limit of the weight(included)
                int extra_edge = 2 -> the number of extra edges
@@ -755,7 +1153,7 @@ class Graph:
             lambda: random.randint(weight_limit[0], weight_limit[1]))
 
         point_to_skip = point_count + 3
-        graph = Graph(point_count, directed)
+        graph = Graph(point_count, directed, kwargs.get("compact", False))
         if point_count % 2 == 1:
             point_to_skip = point_count / 2 + 1
         half = int(point_count / 2)
@@ -829,7 +1227,7 @@ class Graph:
             raise ValueError("tree_count must be between 1 and point_count")
         tree = Graph.tree(point_count, **kwargs)
         tree_edges = list(tree.iterate_edges())
-        result = Graph(point_count, tree.directed)
+        result = Graph(point_count, tree.directed, tree.compact)
         need_add = random.sample(tree_edges, len(tree_edges) - tree_count + 1)
         for edge in need_add:
             result.add_edge(edge.start, edge.end, weight=edge.weight)
@@ -5,20 +5,36 @@ Classes:
 """
 
 from __future__ import absolute_import
+import asyncio
+import locale
 import os
 import re
-import signal
 import subprocess
+import sys
 import tempfile
-from typing import Union, overload, Optional, List, cast
-from io import IOBase
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterator, Union, overload, Optional, List, cast
+from io import IOBase, TextIOWrapper
 from . import log
-from .utils import list_like, make_unicode
+from .cache import OutputCache
+from .compression import (SUFFIXES, CompressedWriter, decompressed_pipe,
+                          detect_compression)
+from .process import (AccountedPopen, ProcessResult, kill_process_group,
+                      make_preexec)
+from .utils import (_ARRAY_TYPES, _FD_CHUNK_SIZE, _write_fd, _read_fd,
+                    array_like, array_to_str, iterator_like, list_like,
+                    make_unicode)
 
 
 class IO:
     """IO tool class. It will process the input and output files."""
 
+    ITER_CHUNK_SIZE = 1 << 14
+    """How many elements are taken from an iterator argument at a time."""
+
     @overload
     def __init__(
         self,
@@ -27,6 +43,8 @@ class IO:
         *,
         disable_output: bool = False,
         make_dirs: bool = False,
+        buffer_size: int = 0,
+        compression: Optional[str] = None,
     ) -> None:
         ...
 
@@ -40,6 +58,8 @@ class IO:
         output_suffix: str = ".out",
         disable_output: bool = False,
         make_dirs: bool = False,
+        buffer_size: int = 0,
+        compression: Optional[str] = None,
     ) -> None:
         ...
 
@@ -53,6 +73,8 @@ class IO:
         output_suffix: str = ".out",
         disable_output: bool = False,
         make_dirs: bool = False,
+        buffer_size: int = 0,
+        compression: Optional[str] = None,
     ):
         """
         Args:
@@ -68,6 +90,13 @@ class IO:
             output_suffix (optional): the suffix of the output file. Defaults to '.out'.
             disable_output (optional): set to True to disable output file. Defaults to False.
             make_dirs (optional): set to True to create dir if path is not found. Defaults to False.
+            buffer_size (optional): keep up to this many characters of written text in memory
+                and flush them to the file in one chunk. 0 means every write goes straight
+                to the file. Defaults to 0.
+            compression (optional): "gzip", "xz" or "zstd" to compress the input and output
+                files given by name, adding the suffix ".gz", ".xz" or ".zst" if it is missing.
+                If it's None, names ending with one of these suffixes are compressed.
+                zstd needs the package `zstandard`. Defaults to None.
         Examples:
             >>> IO("a","b")
             # create input file "a" and output file "b"
@@ -90,8 +119,15 @@ class IO:
             >>> IO("./io/data.in", "./io/data.out", disable_output = True)
             # input file "./io/data.in" and output file "./io/data.out"
             # if the dir "./io" not found it will be created
+            >>> IO(file_prefix="data", compression="gzip")
+            # create gzip-compressed input file "data.in.gz" and output file "data.out.gz"
+            >>> IO("data.in.xz", "data.out.xz")
+            # create xz-compressed input file "data.in.xz" and output file "data.out.xz"
         """
         self.__closed = False
+        self.__buffer_size = buffer_size
+        self.__pending = {}
+        self.__pending_size = {}
         self.input_file = cast(IOBase, None)
         self.output_file = None
         if file_prefix is not None:
@@ -102,10 +138,11 @@ class IO:
                 self.__escape_format(file_prefix),
                 self.__escape_format(output_suffix))
         self.input_filename, self.output_filename = None, None
+        self.input_compression, self.output_compression = None, None
         self.__input_temp, self.__output_temp = False, False
-        self.__init_file(input_file, data_id, "i", make_dirs)
+        self.__init_file(input_file, data_id, "i", make_dirs, compression)
         if not disable_output:
-            self.__init_file(output_file, data_id, "o", make_dirs)
+            self.__init_file(output_file, data_id, "o", make_dirs, compression)
         else:
             self.output_file = None
         self.is_first_char = {}
@@ -116,6 +153,7 @@ class IO:
         data_id: Union[int, None],
         file_type: str,
         make_dirs: bool,
+        compression: Optional[str] = None,
     ):
         if isinstance(f, IOBase):
             # consider ``f`` as a file object
@@ -144,19 +182,26 @@ class IO:
         else:
             # consider ``f`` as filename template
             filename = f.format(data_id or "")
+            if compression is None:
+                compression = detect_compression(filename)
+            elif not filename.endswith(SUFFIXES.get(compression, "")):
+                filename += SUFFIXES[compression]
             # be sure dir is existed
             if make_dirs:
                 self.__make_dirs(filename)
             if file_type == "i":
                 self.input_filename = filename
+                self.input_compression = compression
             else:
                 self.output_filename = filename
-            self.__init_file(
-                open(filename, "w+", newline="\n", encoding="utf-8"),
-                data_id,
-                file_type,
-                make_dirs,
-            )
+                self.output_compression = compression
+            if compression is None:
+                f = open(filename, "w+", newline="\n", encoding="utf-8")
+            else:
+                f = TextIOWrapper(CompressedWriter(filename, compression),
+                                  newline="\n",
+                                  encoding="utf-8")
+            self.__init_file(f, data_id, file_type, make_dirs)
 
     def __escape_format(self, st: str):
         """replace "{}" to "{{}}" """
@@ -177,6 +222,8 @@ class IO:
         if self.__closed:
             # avoid double close
             return
+        self.__flush_pending(self.input_file)
+        self.__flush_pending(self.output_file)
         deleted = False
         try:
             # on posix, one can remove a file while it's opend by a process
@@ -208,19 +255,94 @@ class IO:
     def __write(self, file: IOBase, *args, **kwargs):
         """
         Write every element in *args into file. If the element isn't "\n", insert `separator`.
-        It will convert every element into str.
+        It will convert every element into str. Lists, tuples and typed arrays
+        (`array.array`, `memoryview`, `numpy.ndarray`) are flattened.
+        Iterators (like generators) are consumed in chunks of `ITER_CHUNK_SIZE` elements.
+        """
+        separator = make_unicode(kwargs.get("separator", " "))
+        buf = []
+        self.is_first_char[file] = self.__collect(
+            file, buf, args, separator, self.is_first_char.get(file, True))
+        self.__emit(file, "".join(buf))
+
+    def __collect(self, file: IOBase, buf: List[str], args, separator: str,
+                  first: bool) -> bool:
+        """
+        Append the text of every element in `args` to `buf`.
+        Flat lists are joined in one pass instead of token by token.
+        Iterators are written out chunk by chunk so that they are never fully in memory.
+        Args:
+            file: the file that the text will be written into
+            buf: the list to append the text pieces to
+            args: the elements to write
+            separator: the separator between elements
+            first: whether nothing has been written on the current line
+        Returns:
+            whether nothing has been written on the current line afterwards
         """
-        separator = kwargs.get("separator", " ")
         for arg in args:
             if list_like(arg):
-                self.__write(file, *arg, **kwargs)
+                if not self.__is_flat(arg):
+                    first = self.__collect(file, buf, arg, separator, first)
+                elif arg:
+                    if not first:
+                        buf.append(separator)
+                    buf.append(separator.join(map(make_unicode, arg)))
+                    first = False
+            elif array_like(arg):
+                text = array_to_str(arg, separator)
+                if text:
+                    if not first:
+                        buf.append(separator)
+                    buf.append(text)
+                    first = False
+            elif iterator_like(arg):
+                while True:
+                    chunk = list(islice(arg, self.ITER_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    first = self.__collect(file, buf, (chunk, ), separator,
+                                           first)
+                    self.__emit(file, "".join(buf))
+                    buf.clear()
             else:
-                if arg != "\n" and not self.is_first_char.get(file, True):
-                    file.write(make_unicode(separator))
-                self.is_first_char[file] = False
-                file.write(make_unicode(arg))
+                if arg != "\n" and not first:
+                    buf.append(separator)
+                first = False
+                buf.append(make_unicode(arg))
                 if arg == "\n":
-                    self.is_first_char[file] = True
+                    first = True
+        return first
+
+    @staticmethod
+    def __is_flat(arg) -> bool:
+        """Whether `arg` holds neither nested lists, arrays, iterators nor "\n" tokens."""
+        for t in set(map(type, arg)):
+            if issubclass(t, (tuple, list) + _ARRAY_TYPES):
+                return False
+            if issubclass(t, Iterator) and not issubclass(t, IOBase):
+                return False
+        return "\n" not in arg
+
+    def __emit(self, file: IOBase, text: str):
+        """Write `text` into file, or keep it in the buffer if buffering is enabled."""
+        if not text:
+            return
+        if self.__buffer_size <= 0:
+            file.write(text)
+            return
+        self.__pending.setdefault(file, []).append(text)
+        size = self.__pending_size.get(file, 0) + len(text)
+        self.__pending_size[file] = size
+        if size >= self.__buffer_size:
+            self.__flush_pending(file)
+
+    def __flush_pending(self, file: Optional[IOBase]):
+        """Write the buffered text of `file` into it."""
+        pending = self.__pending.pop(file, None)
+        self.__pending_size.pop(file, None)
+        if pending:
+            file.write("".join(pending))
 
     def __clear(self, file: IOBase, pos: int = 0):
         """
@@ -229,18 +351,14 @@ class IO:
             file: Which file to clear
             pos: Where file will truncate.
         """
+        self.__flush_pending(file)
         file.truncate(pos)
         self.is_first_char[file] = True
         file.seek(pos)
 
     @staticmethod
     def _kill_process_and_children(proc: subprocess.Popen):
-        if os.name == "posix":
-            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
-        elif os.name == "nt":
-            os.system(f"TASKKILL /F /T /PID {proc.pid} > nul")
-        else:
-            proc.kill()  # Not currently supported
+        kill_process_group(proc)
 
     def input_write(self, *args, **kwargs):
         """
@@ -278,7 +396,10 @@ class IO:
                    shell_cmd: Union[str, List[str]],
                    time_limit: Optional[float] = None,
                    *,
-                   replace_EOL: bool = True):
+                   replace_EOL: bool = True,
+                   cache: Optional[OutputCache] = None,
+                   stream: bool = False,
+                   memory_limit: Optional[int] = None):
         """
         Run the command `shell_cmd` (usually the std program) and send it the input file as stdin.
         Write its output to the output file.
@@ -288,38 +409,335 @@ class IO:
                 None means infinity. Defaults to None.
             replace_EOL: Set whether to replace the end-of-line sequence with `'\\n'`.
                 Defaults to True.
+            cache: an `OutputCache` to look the output up in before running the command.
+                If the same input was run by the same command and std binary before,
+                the cached output is copied instead. None means no cache. Defaults to None.
+            stream: Set to True to let the command write straight into the output file
+                instead of collecting its output in memory first. The output is kept as
+                bytes, and `replace_EOL` is applied by a streaming pass over the written part.
+                Defaults to False.
+            memory_limit: the limit of the address space (bytes) of the command.
+                It is only supported on POSIX. None means no limit. Defaults to None.
+        Returns:
+            a `ProcessResult` with the wall time, CPU time and peak memory of the command,
+            or None if the cached output is used.
+        """
+        origin_pos, start = self.__begin_output_gen(stream, cache)
+        try:
+            key = self.__load_cache(cache, shell_cmd, replace_EOL)
+            if key is True:
+                return None
+
+            with self.__stdin() as stdin, self.__stdout(stream,
+                                                        replace_EOL) as stdout:
+                proc = AccountedPopen(
+                    shell_cmd,
+                    shell=True,
+                    stdin=stdin,
+                    stdout=stdout,
+                    universal_newlines=replace_EOL and not stream,
+                    new_session=True,
+                    memory_limit=memory_limit,
+                )
+
+                try:
+                    output, _ = proc.communicate(timeout=time_limit)
+                except subprocess.TimeoutExpired:
+                    # proc.kill()  # didn't work because `shell=True`.
+                    self._kill_process_and_children(proc)
+                    raise
+            self.__end_output_gen(output, start, replace_EOL, stream, cache,
+                                  key, proc.returncode)
+        finally:
+            if origin_pos is not None:
+                self.input_file.seek(origin_pos)
+        return proc.result()
+
+    async def output_gen_async(self,
+                               shell_cmd: Union[str, List[str]],
+                               time_limit: Optional[float] = None,
+                               *,
+                               replace_EOL: bool = True,
+                               cache: Optional[OutputCache] = None,
+                               stream: bool = False,
+                               memory_limit: Optional[int] = None):
+        """
+        The asyncio version of `output_gen`. The arguments are the same.
+        A list `shell_cmd` is run without a shell.
+        The CPU time and the peak memory in the returned `ProcessResult` are always None.
+        """
+        origin_pos, start = self.__begin_output_gen(stream, cache)
+        try:
+            key = self.__load_cache(cache, shell_cmd, replace_EOL)
+            if key is True:
+                return None
+
+            start_time = time.perf_counter()
+            preexec_fn = make_preexec(memory_limit)
+            with self.__stdin() as stdin, self.__stdout(stream,
+                                                        replace_EOL) as stdout:
+                if isinstance(shell_cmd, str):
+                    create = asyncio.create_subprocess_shell(
+                        shell_cmd,
+                        stdin=stdin,
+                        stdout=stdout,
+                        start_new_session=True,
+                        preexec_fn=preexec_fn)
+                else:
+                    create = asyncio.create_subprocess_exec(
+                        *shell_cmd,
+                        stdin=stdin,
+                        stdout=stdout,
+                        start_new_session=True,
+                        preexec_fn=preexec_fn)
+                proc = await create
+
+                try:
+                    output, _ = await asyncio.wait_for(proc.communicate(),
+                                                       time_limit)
+                except asyncio.TimeoutError:
+                    self._kill_process_and_children(proc)
+                    await proc.wait()
+                    raise subprocess.TimeoutExpired(shell_cmd,
+                                                    time_limit) from None
+            wall_time = time.perf_counter() - start_time
+            if replace_EOL and not stream:
+                output = output.decode(locale.getpreferredencoding(False))
+                output = output.replace("\r\n", "\n").replace("\r", "\n")
+            self.__end_output_gen(output, start, replace_EOL, stream, cache,
+                                  key, proc.returncode)
+        finally:
+            if origin_pos is not None:
+                self.input_file.seek(origin_pos)
+        return ProcessResult(proc.returncode, wall_time)
+
+    @staticmethod
+    def output_gen_all(ios: List["IO"],
+                       shell_cmd: Union[str, List[str]],
+                       time_limit: Optional[float] = None,
+                       *,
+                       max_workers: Optional[int] = None,
+                       **kwargs):
+        """
+        Run `output_gen` for every IO object in `ios` concurrently,
+        with at most `max_workers` commands running at the same time.
+        Args:
+            ios: the IO objects to generate the output files of.
+            shell_cmd: the command to run, usually the std program.
+            time_limit: the time limit (seconds) of every run. None means infinity.
+            max_workers: the maximum number of concurrent runs.
+                None means the number of CPUs. Defaults to None.
+            **kwargs: other keyword arguments of `output_gen`.
+        """
+        if os.name == "nt":
+            # only the proactor loop supports subprocesses on Windows
+            loop = asyncio.ProactorEventLoop()
+        else:
+            loop = asyncio.new_event_loop()
+        watcher = None
+        if os.name == "posix" and sys.version_info < (3, 8):
+            # the child watcher of Python 3.6 and 3.7 needs the loop attached
+            watcher = asyncio.get_child_watcher()
+            watcher.attach_loop(loop)
+        try:
+            return loop.run_until_complete(
+                IO.output_gen_all_async(ios,
+                                        shell_cmd,
+                                        time_limit,
+                                        max_workers=max_workers,
+                                        **kwargs))
+        finally:
+            if watcher is not None:
+                watcher.attach_loop(None)
+            loop.close()
+
+    @staticmethod
+    async def output_gen_all_async(ios: List["IO"],
+                                   shell_cmd: Union[str, List[str]],
+                                   time_limit: Optional[float] = None,
+                                   *,
+                                   max_workers: Optional[int] = None,
+                                   **kwargs):
+        """The asyncio version of `output_gen_all`. The arguments are the same."""
+        semaphore = asyncio.Semaphore(max_workers or os.cpu_count() or 1)
+
+        async def run(io: IO):
+            async with semaphore:
+                return await io.output_gen_async(shell_cmd, time_limit,
+                                                 **kwargs)
+
+        return await asyncio.gather(*[run(io) for io in ios])
+
+    def __begin_output_gen(self, stream: bool, cache: Optional[OutputCache]):
+        """
+        Flush everything and rewind the input file before running the std program.
+        Returns:
+            the position of the input file to restore, and the offset of the output file
+            where the output starts. Both are None for compressed files, and the offset
+            is only taken in stream mode or with a cache, so that the output file
+            may be any file object otherwise, like a `StringIO`.
         """
         if self.output_file is None:
             raise ValueError("Output file is disabled")
         self.flush_buffer()
-        origin_pos = self.input_file.tell()
-        self.input_file.seek(0)
-
-        proc = subprocess.Popen(
-            shell_cmd,
-            shell=True,
-            stdin=self.input_file.fileno(),
-            stdout=subprocess.PIPE,
-            universal_newlines=replace_EOL,
-            preexec_fn=os.setsid if os.name == "posix" else None,
-        )
+        origin_pos = start = None
+        if self.input_compression is None:
+            origin_pos = self.input_file.tell()
+            self.input_file.seek(0)
+        self.output_file.flush()
+        if self.output_compression is None and (stream or cache is not None):
+            start = os.lseek(self.output_file.fileno(), 0, os.SEEK_CUR)
+        return origin_pos, start
 
-        try:
-            output, _ = proc.communicate(timeout=time_limit)
-        except subprocess.TimeoutExpired:
-            # proc.kill()  # didn't work because `shell=True`.
-            self._kill_process_and_children(proc)
-            raise
+    @contextmanager
+    def __stdin(self):
+        """The stdin of the std program: the input file itself or a decompressing pipe."""
+        if self.input_compression is None:
+            yield self.input_file.fileno()
         else:
+            with decompressed_pipe(self.input_filename,
+                                   self.input_compression) as read_fd:
+                yield read_fd
+
+    @contextmanager
+    def __stdout(self, stream: bool, replace_EOL: bool):
+        """
+        The stdout of the std program: a pipe, the output file itself,
+        or a pipe into the compressor of the output file in stream mode.
+        """
+        if not stream:
+            yield subprocess.PIPE
+        elif self.output_compression is None:
+            yield self.output_file.fileno()
+        else:
+            read_fd, write_fd = os.pipe()
+            thread = threading.Thread(target=self.__compress_output,
+                                      args=(read_fd, replace_EOL),
+                                      daemon=True)
+            thread.start()
+            try:
+                yield write_fd
+            finally:
+                # the thread stops at EOF once the program exits
+                os.close(write_fd)
+                thread.join()
+                os.close(read_fd)
+
+    def __compress_output(self, read_fd: int, replace_EOL: bool):
+        """Copy everything from `read_fd` into the compressed output file."""
+        output = cast(TextIOWrapper, self.output_file).buffer
+        pending_cr = False
+        while True:
+            chunk = os.read(read_fd, _FD_CHUNK_SIZE)
+            if not chunk:
+                break
             if replace_EOL:
+                chunk, pending_cr = self.__replace_EOL(chunk, pending_cr)
+            output.write(chunk)
+        if pending_cr:
+            output.write(b"\n")
+
+    def __load_cache(self, cache: Optional[OutputCache],
+                     shell_cmd: Union[str, List[str]], replace_EOL: bool):
+        """
+        Look the output up in `cache` and copy it into the output file if found.
+        Returns:
+            True if the cached output is used, otherwise the cache key (None without cache)
+        """
+        if cache is None:
+            return None
+        if (self.input_compression is not None
+                or self.output_compression is not None):
+            raise ValueError("cache is not supported for compressed files")
+        key = cache.key(self.input_file.fileno(), shell_cmd, replace_EOL)
+        output_fd = self.output_file.fileno()
+        if cache.load(key, output_fd) is None:
+            return key
+        self.output_file.seek(os.lseek(output_fd, 0, os.SEEK_CUR))
+        log.debug(self.output_filename, " done (cached)")
+        return True
+
+    def __end_output_gen(self, output: Union[str, bytes, None],
+                         start: Optional[int], replace_EOL: bool, stream: bool,
+                         cache: Optional[OutputCache], key: Optional[str],
+                         returncode: int):
+        """
+        Write the output of the std program, and store it into the cache
+        if the program exited normally, so that a crash is never replayed.
+        """
+        if self.output_compression is not None:
+            # in stream mode, the output has been compressed on the fly
+            if stream:
+                pass
+            elif replace_EOL:
                 self.output_file.write(output)
             else:
-                os.write(self.output_file.fileno(), output)
-        finally:
-            self.input_file.seek(origin_pos)
+                cast(TextIOWrapper, self.output_file).buffer.write(output)
+            log.debug(self.output_filename, " done")
+            return
+
+        if stream:
+            # the child shares the file offset of `output_fd`
+            output_fd = self.output_file.fileno()
+            end = os.lseek(output_fd, 0, os.SEEK_CUR)
+            if replace_EOL:
+                end = self.__normalize_EOL(output_fd, start, end)
+            self.output_file.seek(end)
+        elif replace_EOL:
+            self.output_file.write(output)
+        else:
+            output_fd = self.output_file.fileno()
+            _write_fd(output_fd, output)
+            self.output_file.seek(os.lseek(output_fd, 0, os.SEEK_CUR))
+
+        if key is not None and returncode == 0:
+            self.output_file.flush()
+            output_fd = self.output_file.fileno()
+            cache.store(key, output_fd, start,
+                        os.lseek(output_fd, 0, os.SEEK_CUR))
 
         log.debug(self.output_filename, " done")
 
+    @staticmethod
+    def __replace_EOL(chunk: bytes, pending_cr: bool):
+        """
+        Replace "\\r\\n" and "\\r" with "\\n" in one chunk of a stream.
+        A trailing "\\r" is held back, since it may be followed by "\\n" in the next chunk.
+        Returns:
+            the replaced chunk, and whether a "\\r" is held back
+        """
+        if pending_cr:
+            chunk = b"\r" + chunk
+        pending_cr = chunk.endswith(b"\r")
+        if pending_cr:
+            chunk = chunk[:-1]
+        return chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n"), pending_cr
+
+    @staticmethod
+    def __normalize_EOL(fd: int, start: int, end: int) -> int:
+        """
+        Replace "\\r\\n" and "\\r" with "\\n" in the bytes between `start` and `end`
+        of the file descriptor `fd` in place, chunk by chunk.
+        Returns:
+            the new end of the replaced bytes
+        """
+        write_pos = start
+        pending_cr = False
+        for chunk in _read_fd(fd, start, end):
+            chunk, pending_cr = IO.__replace_EOL(chunk, pending_cr)
+            # the text only shrinks, so it never overwrites unread bytes
+            os.lseek(fd, write_pos, os.SEEK_SET)
+            _write_fd(fd, chunk)
+            write_pos += len(chunk)
+        if pending_cr:
+            os.lseek(fd, write_pos, os.SEEK_SET)
+            _write_fd(fd, b"\n")
+            write_pos += 1
+        if write_pos < end and end == os.fstat(fd).st_size:
+            os.ftruncate(fd, write_pos)
+        os.lseek(fd, write_pos, os.SEEK_SET)
+        return write_pos
+
     def output_write(self, *args, **kwargs):
         """
         Write every element in *args into the output file. Splits with `separator`.
@@ -356,5 +774,7 @@ class IO:
         self.__clear(self.output_file, pos)
 
     def flush_buffer(self):
-        """Flush the input file"""
+        """Write out the buffered text and flush the input file"""
+        self.__flush_pending(self.input_file)
+        self.__flush_pending(self.output_file)
         self.input_file.flush()
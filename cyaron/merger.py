@@ -12,7 +12,7 @@ class Merger:
         """
         self.graphs = graphs
         self.G = Graph(sum([len(i.edges) - 1 for i in graphs]),
-                       graphs[0].directed)
+                       graphs[0].directed, graphs[0].compact)
 
         counter = 0
         for graph in self.graphs:
@@ -42,6 +42,9 @@ class Merger:
     def to_str(self, **kwargs):
         return self.G.to_str(**kwargs)
 
+    def write_to(self, io, **kwargs):
+        self.G.write_to(io, **kwargs)
+
     def __str__(self):
         return self.to_str()
 
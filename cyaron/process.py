@@ -0,0 +1,248 @@
+"""
+A module that runs programs and accounts for the resources they use.
+Classes:
+    ProcessResult: the wall time, CPU time and peak memory of a finished program.
+    AccountedPopen: a `subprocess.Popen` that records the resource usage of the child.
+"""
+
+import codecs
+import io
+import locale
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Optional, Union
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__all__ = [
+    "ProcessResult", "AccountedPopen", "check_output", "stream_output",
+    "kill_process_group"
+]
+
+_CHUNK_SIZE = 1 << 16
+
+
+class ProcessResult:
+    """The resources used by a finished program."""
+
+    def __init__(self,
+                 returncode: int,
+                 wall_time: float,
+                 cpu_time: Optional[float] = None,
+                 max_rss: Optional[int] = None):
+        """
+        Args:
+            returncode: the exit code of the program.
+            wall_time: the wall-clock time (seconds) from start to exit.
+            cpu_time: the user plus system CPU time (seconds), or None if it is unknown.
+            max_rss: the peak resident set size (bytes), or None if it is unknown.
+        """
+        self.returncode = returncode
+        self.wall_time = wall_time
+        self.cpu_time = cpu_time
+        self.max_rss = max_rss
+
+    def __repr__(self):
+        return ("ProcessResult(returncode={}, wall_time={:.3f}, cpu_time={}, "
+                "max_rss={})").format(self.returncode, self.wall_time,
+                                      self.cpu_time, self.max_rss)
+
+    def __str__(self):
+        text = "{:.3f}s".format(self.wall_time)
+        if self.cpu_time is not None:
+            text += " (cpu {:.3f}s)".format(self.cpu_time)
+        if self.max_rss is not None:
+            text += " {:.1f}MiB".format(self.max_rss / (1 << 20))
+        return text
+
+
+def make_preexec(memory_limit: Optional[int] = None):
+    """
+    Return the `preexec_fn` that limits the address space of the child
+    to `memory_limit` bytes, or None if there is nothing to do.
+    It is only supported on POSIX and ignored elsewhere. A `preexec_fn` is
+    not safe with threads, so the new session is started with `start_new_session`.
+    """
+    if os.name != "posix" or memory_limit is None:
+        return None
+
+    def preexec():
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    return preexec
+
+
+class AccountedPopen(subprocess.Popen):
+    """
+    A `subprocess.Popen` that reaps the child with `os.wait4` on POSIX,
+    so that its CPU time and peak memory are known after it exits.
+    """
+
+    def __init__(self,
+                 *args,
+                 new_session: bool = False,
+                 memory_limit: Optional[int] = None,
+                 **kwargs):
+        """
+        Args:
+            *args: the arguments of `subprocess.Popen`.
+            new_session: set to True to run the child in a new session
+                (and so a new process group). Defaults to False.
+            memory_limit: the limit of the address space (bytes) of the child.
+                None means no limit. Defaults to None.
+            **kwargs: the keyword arguments of `subprocess.Popen`.
+        """
+        self.rusage = None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        super().__init__(*args,
+                         start_new_session=new_session,
+                         preexec_fn=make_preexec(memory_limit),
+                         **kwargs)
+
+    if hasattr(os, "wait4"):
+
+        def _try_wait(self, wait_flags):
+            # the same as `subprocess.Popen._try_wait` on POSIX, but keep the rusage.
+            # It is a CPython internal that `wait()` and `poll()` call on 3.6 to 3.13;
+            # test_output_gen_result fails if it is no longer called.
+            try:
+                (pid, sts, rusage) = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                return (self.pid, 0)
+            if pid == self.pid:
+                self.rusage = rusage
+                self.end_time = time.perf_counter()
+            return (pid, sts)
+
+    def result(self):
+        """Return the `ProcessResult` of the child. Call it after the child exits."""
+        end_time = self.end_time
+        if end_time is None:
+            end_time = time.perf_counter()
+        cpu_time = max_rss = None
+        if self.rusage is not None:
+            cpu_time = self.rusage.ru_utime + self.rusage.ru_stime
+            # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+            max_rss = self.rusage.ru_maxrss
+            if sys.platform != "darwin":
+                max_rss *= 1024
+        return ProcessResult(self.returncode, end_time - self.start_time,
+                             cpu_time, max_rss)
+
+
+def check_output(args: Union[str, List[str]],
+                 *,
+                 stdin=None,
+                 timeout: Optional[float] = None,
+                 memory_limit: Optional[int] = None,
+                 shell: bool = False):
+    """
+    Like `subprocess.check_output(..., universal_newlines=True)`,
+    but also return the `ProcessResult` of the program.
+    Returns:
+        the output of the program as str, and its `ProcessResult`
+    """
+    with AccountedPopen(args,
+                        stdin=stdin,
+                        stdout=subprocess.PIPE,
+                        universal_newlines=True,
+                        shell=shell,
+                        new_session=True,
+                        memory_limit=memory_limit) as proc:
+        try:
+            output, _ = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # with a shell, killing the shell alone leaves the program running
+            kill_process_group(proc)
+            proc.communicate()
+            raise
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode,
+                                                args,
+                                                output=output)
+    return output, proc.result()
+
+
+def kill_process_group(proc: subprocess.Popen):
+    """Kill the program and all its children. The program should run in a new session."""
+    if os.name == "posix":
+        os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+    elif os.name == "nt":
+        os.system(f"TASKKILL /F /T /PID {proc.pid} > nul")
+    else:
+        proc.kill()  # Not currently supported
+
+
+def stream_output(args: Union[str, List[str]],
+                  on_output: Callable[[str], bool],
+                  *,
+                  stdin=None,
+                  timeout: Optional[float] = None,
+                  memory_limit: Optional[int] = None,
+                  shell: bool = False):
+    """
+    Like `check_output`, but call `on_output(text)` with every piece of the output
+    as soon as it is read. Once it returns True, the program and all its children
+    are killed and the rest of the output is not read.
+    Returns:
+        the output read as str, the `ProcessResult` of the program,
+        and whether it was stopped by `on_output`
+    """
+    # decode like `universal_newlines=True` does
+    encoding = locale.getpreferredencoding(False)
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(encoding)(), translate=True)
+    chunks = []
+    stopped = False
+    timed_out = threading.Event()
+    with AccountedPopen(args,
+                        stdin=stdin,
+                        stdout=subprocess.PIPE,
+                        shell=shell,
+                        new_session=True,
+                        memory_limit=memory_limit) as proc:
+
+        def expire():
+            timed_out.set()
+            try:
+                kill_process_group(proc)
+            except ProcessLookupError:
+                pass  # it has just exited
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, expire)
+            timer.start()
+        try:
+            fd = proc.stdout.fileno()
+            while True:
+                data = os.read(fd, _CHUNK_SIZE)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    chunks.append(text)
+                    if on_output(text):
+                        stopped = True
+                        kill_process_group(proc)
+                        break
+                if not data:
+                    break
+            proc.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
+    output = "".join(chunks)
+    if timed_out.is_set() and not stopped:
+        raise subprocess.TimeoutExpired(args, timeout, output=output)
+    if proc.returncode and not stopped:
+        raise subprocess.CalledProcessError(proc.returncode,
+                                            args,
+                                            output=output)
+    return output, proc.result(), stopped
@@ -0,0 +1,562 @@
+"""
+A module that runs stress tests (duipai): generate random inputs round after round
+and compare the programs with the std program until they disagree.
+Classes:
+    Stress: run a generator, a std program and the programs to test in a loop.
+    StressResult: the number of rounds, the throughput and the counterexample found.
+    ShrinkResult: a smaller counterexample found by `Stress.shrink` or `Stress.shrink_generator`.
+"""
+
+import atexit
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed, wait)
+from itertools import islice
+from typing import (Any, Callable, Iterable, List, Optional, Tuple, Type,
+                    Union)
+
+from . import log
+from .batch import Batch
+from .compare import Compare, CompareMismatch
+from .consts import DEFAULT_GRADER
+from .io import IO
+from .utils import process_args
+
+__all__ = ["Stress", "StressResult", "StressFailure", "ShrinkResult"]
+
+_worker_ios = {}
+
+
+def _get_worker_io():
+    """The IO object reused by every round run in this process."""
+    # a forked worker inherits the IO object of its parent, which it must not
+    # use or close, so they are kept by process id
+    pid = os.getpid()
+    if pid not in _worker_ios:
+        _worker_ios[pid] = IO(disable_output=True)
+        atexit.register(_worker_ios[pid].close)
+    return _worker_ios[pid]
+
+
+class StressFailure:
+    """A round where the programs disagree with the std program."""
+
+    def __init__(self, round_id: int, seed: Optional[str], error: Exception,
+                 input_path: Optional[str]):
+        """
+        Args:
+            round_id: the id of the round.
+            seed: the random seed of the round. Seeding `random` with it and
+                calling the generator again reproduces the input.
+            error: the `CompareMismatch`, or the error raised when running the programs,
+                like `subprocess.TimeoutExpired`.
+            input_path: the file the input was saved to, or None if it was not saved.
+        """
+        self.round_id = round_id
+        self.seed = seed
+        self.error = error
+        self.input_path = input_path
+
+    def __repr__(self):
+        return "StressFailure(round_id={}, seed={!r}, input_path={!r})".format(
+            self.round_id, self.seed, self.input_path)
+
+
+class StressResult:
+    """The outcome of `Stress.run`."""
+
+    def __init__(self, rounds: int, elapsed: float,
+                 failure: Optional[StressFailure]):
+        """
+        Args:
+            rounds: the number of rounds run.
+            elapsed: the wall time (seconds) of the whole run.
+            failure: the first counterexample, or None if every round passed.
+        """
+        self.rounds = rounds
+        self.elapsed = elapsed
+        self.failure = failure
+
+    @property
+    def throughput(self):
+        """The number of rounds per second."""
+        return self.rounds / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        text = "{} rounds in {:.2f}s ({:.1f} rounds/s)".format(
+            self.rounds, self.elapsed, self.throughput)
+        if self.failure is None:
+            return text + ", no counterexample"
+        return text + ", counterexample in round {}: {}".format(
+            self.failure.round_id, self.failure.error)
+
+
+class ShrinkResult:
+    """The outcome of `Stress.shrink` and `Stress.shrink_generator`."""
+
+    def __init__(self, input: str, size: int, unit: str, runs: int,
+                 elapsed: float, error: Exception, input_path: Optional[str]):
+        """
+        Args:
+            input: the smallest failing input found.
+            size: its size, counted in `unit`.
+            unit: "line" or "token" for `Stress.shrink`, "size" for `Stress.shrink_generator`.
+            runs: the number of candidate inputs the programs were run on.
+            elapsed: the wall time (seconds) of the search.
+            error: the error raised on `input`, usually a `CompareMismatch`.
+            input_path: the file the input was saved to, or None if it was not saved.
+        """
+        self.input = input
+        self.size = size
+        self.unit = unit
+        self.runs = runs
+        self.elapsed = elapsed
+        self.error = error
+        self.input_path = input_path
+
+    def __str__(self):
+        return "shrunk to {} {}{} in {} runs ({:.2f}s): {}".format(
+            self.size, self.unit, "" if self.size == 1 else "s", self.runs,
+            self.elapsed, self.error)
+
+
+def _split_units(text: str, unit: str) -> List[Tuple[int, str]]:
+    """Split an input into the units removed by `Stress.shrink`, tagged with their line."""
+    if unit == "line":
+        return list(enumerate(text.splitlines()))
+    if unit == "token":
+        return [(i, token) for i, line in enumerate(text.splitlines())
+                for token in line.split()]
+    raise ValueError("unit should be 'line' or 'token', got {!r}".format(unit))
+
+
+def _join_units(units: List[Tuple[int, str]]) -> str:
+    """The inverse of `_split_units`: the tokens of a line are joined by spaces."""
+    lines = []
+    last = None
+    for line_id, token in units:
+        if line_id == last:
+            lines[-1].append(token)
+        else:
+            lines.append([token])
+            last = line_id
+    return "".join(" ".join(line) + "\n" for line in lines)
+
+
+def _save_input(io: IO, save_dir: str):
+    """Copy the input file of `io` into a new file in `save_dir`."""
+    fd, path = tempfile.mkstemp(dir=save_dir, suffix=".in")
+    io.input_file.flush()
+    with os.fdopen(fd, "wb") as dst, open(io.input_filename, "rb") as src:
+        shutil.copyfileobj(src, dst)
+    return path
+
+
+def _run_rounds(stress: "Stress", seed: Optional[str], round_ids: List[int],
+                save_dir: Optional[str]):
+    """
+    Run some rounds with the IO object of this process. It runs inside the worker processes.
+    Returns:
+        the number of rounds run, and the `StressFailure` that stopped them or None
+    """
+    io = _get_worker_io()
+    for count, round_id in enumerate(round_ids, 1):
+        case_seed = Batch.case_seed(seed, round_id)
+        io.input_clear_content()
+        random.seed(case_seed)
+        stress.generator(io, round_id)
+        try:
+            stress.check(io)
+        except Exception as e:
+            path = _save_input(io, save_dir) if save_dir is not None else None
+            return count, StressFailure(round_id, case_seed, e, path)
+    return len(round_ids), None
+
+
+class Stress:
+    """
+    A stress test: the input of every round is written by `generator(io, round_id)`,
+    then the programs are compared with the std program on it.
+    """
+
+    def __init__(self,
+                 generator: Callable[[IO, int], Any],
+                 std_program: Union[str, List[str]],
+                 *programs: Union[str, List[str]],
+                 grader: str = DEFAULT_GRADER,
+                 time_limit: Optional[float] = None,
+                 memory_limit: Optional[int] = None):
+        """
+        Args:
+            generator: the function that writes the input of a round. When running in
+                a process pool, it must be defined at the top level of a module.
+            std_program: the std program, usually the brute-force solution.
+            *programs: the programs to test.
+            grader: the grader used by `Compare.program`. Defaults to "NOIPStyle".
+            time_limit: the time limit (seconds) of every program to test. Defaults to None.
+            memory_limit: the memory limit (bytes) of every program. Defaults to None.
+        """
+        self.generator = generator
+        self.std_program = std_program
+        self.programs = programs
+        self.grader = grader
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+
+    def check(self, io: IO):
+        """Compare the programs with the std program on the input of `io`."""
+        programs = self.programs
+        if self.time_limit is not None:
+            programs = [(program, self.time_limit) for program in programs]
+        Compare.program(*programs,
+                        input=io,
+                        std_program=self.std_program,
+                        grader=self.grader,
+                        memory_limit=self.memory_limit,
+                        stop_on_incorrect=True)
+
+    def check_input(self, text: str, failure_types=(CompareMismatch, )):
+        """
+        Run the programs on the input `text` in a new temp file.
+        Returns:
+            the error raised if it is one of `failure_types`, otherwise None
+        """
+        with IO(disable_output=True) as io:
+            io.input_write(text)
+            try:
+                self.check(io)
+            except failure_types as e:
+                return e
+            except Exception:
+                pass
+        return None
+
+    def __first_failure(self, pool, texts, failure_types):
+        """
+        Check the candidate inputs `texts`, in `pool` if it's not None.
+        Once a candidate fails, the queued ones after it are cancelled, but the
+        ones before it still run, so the result does not depend on the timing.
+        Returns:
+            the index of the first failing candidate and its error, or (None, None),
+            and the number of candidates checked
+        """
+        if pool is None:
+            for index, text in enumerate(texts):
+                error = self.check_input(text, failure_types)
+                if error is not None:
+                    return index, error, index + 1
+            return None, None, len(texts)
+        futures = {
+            pool.submit(self.check_input, text, failure_types): index
+            for index, text in enumerate(texts)
+        }
+        failures = {}
+        runs = 0
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            runs += 1
+            error = future.result()
+            if error is not None:
+                failures[futures[future]] = error
+                first_failure = min(failures)
+                for queued, index in futures.items():
+                    if index > first_failure:
+                        queued.cancel()
+        if not failures:
+            return None, None, runs
+        index = min(failures)
+        return index, failures[index], runs
+
+    @staticmethod
+    def __save(text: str, save_input: Optional[str]):
+        if save_input is None:
+            return None
+        with open(save_input, "w", newline="\n") as f:
+            f.write(text)
+        return save_input
+
+    def shrink(self,
+               input: Union[str, StressFailure],
+               *,
+               unit: str = "line",
+               budget: int = 256,
+               time_budget: Optional[float] = None,
+               max_workers: Optional[int] = None,
+               failure_types: Tuple[Type[Exception],
+                                    ...] = (CompareMismatch, ),
+               save_input: Optional[str] = "stress_shrunk.in"):
+        """
+        Make a failing input smaller by delta debugging: remove parts of it,
+        keep any smaller input on which the programs still fail, and split the
+        parts finer when nothing can be removed.
+        The candidates of every step are checked in parallel by a thread pool,
+        because the time goes to the programs, not to Python.
+        Args:
+            input: the path of the failing input, or the `StressFailure` of `Stress.run`.
+            unit: remove whole "line"s, or single "token"s, which keeps the line
+                structure. Removing tokens finds smaller inputs but takes more runs.
+            budget: the maximum number of candidate inputs to check. Defaults to 256.
+            time_budget: the time (seconds) after which no new step is started.
+                None means no limit. Defaults to None.
+            max_workers: the number of candidates checked at once. None means the
+                number of CPUs. 0 or 1 means checking them one by one.
+            failure_types: the errors that count as a failure. Defaults to
+                `CompareMismatch` only, so that inputs which crash the std program,
+                because a count no longer matches for example, are rejected.
+            save_input: the file to save the smallest input to.
+                None means not saving it. Defaults to "stress_shrunk.in".
+        Returns:
+            a `ShrinkResult`
+        """
+        if isinstance(input, StressFailure):
+            input = input.input_path
+        with open(input, "r", newline="\n") as f:
+            units = _split_units(f.read(), unit)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        start = time.perf_counter()
+        runs = 0
+        pool = ThreadPoolExecutor(max_workers) if max_workers > 1 else None
+        try:
+            error = self.check_input(_join_units(units), failure_types)
+            runs += 1
+            if error is None:
+                raise ValueError(
+                    "the input {!r} is not a counterexample".format(input))
+            n = 2
+            while len(units) >= 2 and runs < budget:
+                if (time_budget is not None
+                        and time.perf_counter() - start >= time_budget):
+                    break
+                n = min(n, len(units))
+                parts = [
+                    units[len(units) * i // n:len(units) * (i + 1) // n]
+                    for i in range(n)
+                ]
+                candidates = list(parts)
+                if n > 2:  # with 2 parts, the complements are the parts
+                    candidates += [
+                        units[:len(units) * i // n] +
+                        units[len(units) * (i + 1) // n:] for i in range(n)
+                    ]
+                candidates = candidates[:budget - runs]
+                index, candidate_error, count = self.__first_failure(
+                    pool, [_join_units(c) for c in candidates], failure_types)
+                runs += count
+                if index is not None:
+                    units = candidates[index]
+                    error = candidate_error
+                    n = 2 if index < n else max(n - 1, 2)
+                elif n < len(units):
+                    n = min(n * 2, len(units))
+                else:
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        text = _join_units(units)
+        result = ShrinkResult(text, len(units), unit, runs,
+                              time.perf_counter() - start, error,
+                              self.__save(text, save_input))
+        log.info(result)
+        return result
+
+    def shrink_generator(self,
+                         generator: Callable[[IO, int], Any],
+                         sizes: Iterable[int],
+                         *,
+                         tries: int = 4,
+                         seed: Optional[str] = None,
+                         budget: int = 256,
+                         time_budget: Optional[float] = None,
+                         max_workers: Optional[int] = None,
+                         failure_types: Tuple[Type[Exception],
+                                              ...] = (CompareMismatch, ),
+                         save_input: Optional[str] = "stress_shrunk.in"):
+        """
+        Find a small failing input by running a generator with scaled-down parameters:
+        `generator(io, size)` is tried `tries` times with every size in `sizes`,
+        in order, and the first failing input is kept. Give the sizes from small
+        to large, like `[1, 2, 5, 10, 100]`, so that it is the smallest one found.
+        The inputs are generated one by one in this thread, since seeding `random`
+        is not thread-safe, and the programs are run on them in parallel.
+        Pass the result to `shrink` to make it even smaller.
+        Args:
+            generator: the function that writes an input of the given size.
+            sizes: the sizes to try.
+            tries: the number of inputs generated for every size. Defaults to 4.
+            seed: the seed of the search. `random` is seeded with a value derived
+                from it, the size and the try before calling the generator.
+                None means fresh seeds. Defaults to None.
+            budget: the maximum number of inputs to check. Defaults to 256.
+            time_budget: the time (seconds) after which no new input is generated.
+                None means no limit. Defaults to None.
+            max_workers: the number of inputs checked at once. None means the
+                number of CPUs. 0 or 1 means checking them one by one.
+            failure_types: the errors that count as a failure. Defaults to `CompareMismatch`.
+            save_input: the file to save the failing input to.
+                None means not saving it. Defaults to "stress_shrunk.in".
+        Returns:
+            a `ShrinkResult`, or None if no failing input was found
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        todo = ((size, i) for size in sizes for i in range(tries))
+
+        start = time.perf_counter()
+        runs = 0
+        found = None
+        pool = ThreadPoolExecutor(max_workers) if max_workers > 1 else None
+        try:
+            with IO(disable_output=True) as io:
+                while found is None and runs < budget:
+                    if (time_budget is not None
+                            and time.perf_counter() - start >= time_budget):
+                        break
+                    window = list(
+                        islice(todo, min(max(max_workers, 1), budget - runs)))
+                    if not window:
+                        break
+                    texts = []
+                    for size, i in window:
+                        io.input_clear_content()
+                        random.seed(
+                            Batch.case_seed(Batch.case_seed(seed, size), i))
+                        generator(io, size)
+                        io.flush_buffer()
+                        io.input_file.seek(0)
+                        texts.append(io.input_file.read())
+                    index, error, count = self.__first_failure(
+                        pool, texts, failure_types)
+                    runs += count
+                    if index is not None:
+                        found = (window[index][0], texts[index], error)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - start
+        if found is None:
+            log.info("no failing input found in {} runs ({:.2f}s)".format(
+                runs, elapsed))
+            return None
+        size, text, error = found
+        result = ShrinkResult(text, size, "size", runs, elapsed, error,
+                              self.__save(text, save_input))
+        log.info(result)
+        return result
+
+    def run(self,
+            rounds: Optional[int] = None,
+            *,
+            time_budget: Optional[float] = None,
+            seed: Optional[str] = None,
+            max_workers: Optional[int] = None,
+            batch_size: int = 8,
+            save_input: Optional[str] = "stress_failed.in"):
+        """
+        Run rounds until a counterexample is found, `rounds` rounds are run,
+        or `time_budget` seconds have passed.
+        Every worker process writes its inputs into the same temp file round after round.
+        Args:
+            rounds: the maximum number of rounds. None means no limit. Defaults to None.
+            time_budget: the time (seconds) after which no new round is started.
+                None means no limit. Defaults to None.
+            seed: the seed of the whole run. Round i is seeded with a value derived
+                from it and i, so a counterexample can be reproduced. If it's None, use
+                the `--randseed` command line argument if given, or a random one.
+            max_workers: the number of worker processes. None means the number of CPUs.
+                0 or 1 means running the rounds one by one in this process.
+            batch_size: the number of rounds sent to a worker at a time. Defaults to 8.
+            save_input: the file to save the input of the counterexample to.
+                None means not saving it. Defaults to "stress_failed.in".
+        Returns:
+            a `StressResult`
+        """
+        if seed is None:
+            seed = process_args()
+        if seed is None:
+            seed = "%016x" % random.getrandbits(64)
+        save_dir = None
+        if save_input is not None:
+            save_dir = os.path.dirname(os.path.abspath(save_input))
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        start = time.perf_counter()
+
+        def batches():
+            first = 0
+            while rounds is None or first < rounds:
+                if (time_budget is not None
+                        and time.perf_counter() - start >= time_budget):
+                    return
+                last = first + batch_size
+                if rounds is not None:
+                    last = min(last, rounds)
+                yield list(range(first, last))
+                first = last
+
+        done = 0
+        failures = []
+        if max_workers <= 1:
+            for round_ids in batches():
+                count, failure = _run_rounds(self, seed, round_ids, save_dir)
+                done += count
+                if failure is not None:
+                    failures.append(failure)
+                    break
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                pending = set()
+                first_round = {}
+                todo = batches()
+                while True:
+                    while not failures and len(pending) < max_workers * 2:
+                        round_ids = next(todo, None)
+                        if round_ids is None:
+                            break
+                        future = pool.submit(_run_rounds, self, seed,
+                                             round_ids, save_dir)
+                        first_round[future] = round_ids[0]
+                        pending.add(future)
+                    if not pending:
+                        break
+                    finished, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        if future.cancelled():
+                            continue
+                        count, failure = future.result()
+                        done += count
+                        if failure is not None:
+                            failures.append(failure)
+                    if failures:
+                        # the earlier rounds still run, so that the result is
+                        # the same as running the rounds one by one
+                        first_failure = min(f.round_id for f in failures)
+                        for future in pending:
+                            if first_round[future] > first_failure:
+                                future.cancel()
+
+        elapsed = time.perf_counter() - start
+        failure = None
+        if failures:
+            failures.sort(key=lambda f: f.round_id)
+            failure = failures[0]
+            for other in failures[1:]:
+                if other.input_path is not None:
+                    os.remove(other.input_path)
+            if failure.input_path is not None:
+                os.replace(failure.input_path, save_input)
+                failure.input_path = save_input
+        result = StressResult(done, elapsed, failure)
+        log.info(result)
+        return result
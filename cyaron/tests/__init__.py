@@ -6,3 +6,6 @@ from .compare_test import TestCompare
 from .graph_test import TestGraph
 from .vector_test import TestVector
 from .general_test import TestGeneral
+from .batch_test import TestBatch
+from .cache_test import TestCache
+from .stress_test import TestStress
@@ -0,0 +1,74 @@
+import unittest
+import os
+import random
+import sys
+import shutil
+import tempfile
+from cyaron import Batch, escape_path
+from cyaron.batch import main
+
+
+def generate(io, data_id):
+    io.input_writeln(data_id, random.randint(1, 10**9))
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.temp_directory = tempfile.mkdtemp()
+        os.chdir(self.temp_directory)
+
+    def tearDown(self):
+        os.chdir(self.original_directory)
+        try:
+            shutil.rmtree(self.temp_directory)
+        except:
+            pass
+
+    def read_cases(self, prefix, suffix, data_ids):
+        contents = []
+        for i in data_ids:
+            with open("{}{}{}".format(prefix, i, suffix),
+                      encoding="utf-8") as f:
+                contents.append(f.read())
+        return contents
+
+    def test_seed_is_deterministic(self):
+        Batch.run(generate,
+                  range(1, 5),
+                  file_prefix="seq",
+                  seed="233",
+                  max_workers=1)
+        Batch.run(generate,
+                  range(1, 5),
+                  file_prefix="pool",
+                  seed="233",
+                  max_workers=2)
+        sequential = self.read_cases("seq", ".in", range(1, 5))
+        self.assertEqual(sequential, self.read_cases("pool", ".in",
+                                                     range(1, 5)))
+        self.assertEqual(len(set(sequential)), 4)
+        self.assertFalse(os.path.exists("seq1.out"))
+
+    def test_std(self):
+        with open("std.py", "w", encoding="utf-8") as f:
+            f.write("print(sum(map(int, input().split())))")
+        Batch.run(generate, [1, 2, 3],
+                  file_prefix="case",
+                  std=f"{escape_path(sys.executable)} std.py",
+                  max_workers=2)
+        for inp, out in zip(self.read_cases("case", ".in", [1, 2, 3]),
+                            self.read_cases("case", ".out", [1, 2, 3])):
+            self.assertEqual(int(out), sum(map(int, inp.split())))
+
+    def test_cli(self):
+        with open("gen.py", "w", encoding="utf-8") as f:
+            f.write("def make(io, data_id):\n"
+                    "    io.input_writeln(data_id * 2)\n")
+        main([
+            "gen.py", "1-3,5", "--func", "make", "--prefix", "cli", "-j", "2",
+            "--randseed=1"
+        ])
+        self.assertEqual(self.read_cases("cli", ".in", [1, 2, 3, 5]),
+                         ["2\n", "4\n", "6\n", "10\n"])
@@ -0,0 +1,185 @@
+import unittest
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+from cyaron import IO, Compare, OutputCache, ResultCache, escape_path
+from cyaron.compare import CompareMismatch
+from cyaron.graders import CYaRonGraders, float_grader
+from cyaron.output_capture import captured_output
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.temp_directory = tempfile.mkdtemp()
+        os.chdir(self.temp_directory)
+        with open("std.py", "w", encoding="utf-8") as f:
+            f.write("with open('runs.txt', 'a') as f:\n"
+                    "    f.write('.')\n"
+                    "print(int(input()) * 2)\n")
+        self.std = f"{escape_path(sys.executable)} std.py"
+
+    def tearDown(self):
+        os.chdir(self.original_directory)
+        try:
+            shutil.rmtree(self.temp_directory)
+        except:
+            pass
+
+    def runs(self):
+        with open("runs.txt", encoding="utf-8") as f:
+            return len(f.read())
+
+    def gen(self, cache, value, data_id=1):
+        with IO(file_prefix="cache", data_id=data_id) as test:
+            test.input_writeln(value)
+            test.output_write("answer:")
+            test.output_gen(self.std, cache=cache)
+        with open("cache{}.out".format(data_id), encoding="utf-8") as f:
+            return f.read()
+
+    def test_output_gen_cache(self):
+        cache = OutputCache("cache_dir")
+        self.assertEqual(self.gen(cache, 21), "answer:42\n")
+        self.assertEqual(self.gen(cache, 21, 2), "answer:42\n")
+        self.assertEqual(self.runs(), 1)
+        self.assertEqual(self.gen(cache, 5), "answer:10\n")
+        self.assertEqual(self.runs(), 2)
+
+        # editing the std program invalidates the cache
+        with open("std.py", "a", encoding="utf-8") as f:
+            f.write("# changed\n")
+        self.assertEqual(self.gen(cache, 21), "answer:42\n")
+        self.assertEqual(self.runs(), 3)
+
+        cache.clear()
+        self.assertEqual(self.gen(cache, 21), "answer:42\n")
+        self.assertEqual(self.runs(), 4)
+
+    def test_failed_run_not_cached(self):
+        cache = OutputCache("cache_dir")
+        self.gen(cache, "oops")
+        self.gen(cache, "oops")
+        self.assertEqual(self.runs(), 2)
+
+    def test_eviction(self):
+        cache = OutputCache("cache_dir", max_size=8)
+        for i in range(10):
+            self.gen(cache, 1000 + i)
+        self.assertLessEqual(
+            sum(entry.stat().st_size for entry in os.scandir("cache_dir")), 8)
+        self.assertEqual(self.runs(), 10)
+
+    def test_result_cache(self):
+        for name, body in (("right", "print(int(input()) * 2)"),
+                           ("wrong", "print(int(input()) * 3)"),
+                           ("slow", "import time\ntime.sleep(5)")):
+            with open(name + ".py", "w", encoding="utf-8") as f:
+                f.write("with open('runs.txt', 'a') as f:\n"
+                        "    f.write('.')\n" + body + "\n")
+        python = escape_path(sys.executable)
+        right, wrong = f"{python} right.py", f"{python} wrong.py"
+        slow = (f"{python} slow.py", 0.2)
+        cache = ResultCache("results")
+
+        def compare(*programs, executor="thread", value=21):
+            with IO() as test:
+                test.input_writeln(value)
+                with captured_output():
+                    return Compare.program(*programs,
+                                           input=test,
+                                           std_program=self.std,
+                                           cache=cache,
+                                           executor=executor,
+                                           max_workers=2,
+                                           stop_on_incorrect=False)
+
+        right_args = [sys.executable, "right.py"]
+        results = compare(right, right_args)
+        self.assertEqual(self.runs(), 3)
+        # neither the programs nor the std program run again
+        cached_results = compare(right, right_args)
+        self.assertEqual(self.runs(), 3)
+        self.assertEqual([r.wall_time for r in results],
+                         [r.wall_time for r in cached_results])
+        for executor in ("thread", "process"):
+            with self.assertRaises(CompareMismatch):
+                compare(right, wrong, executor=executor)
+        self.assertEqual(self.runs(), 5)
+        for _ in range(2):
+            with self.assertRaises(subprocess.TimeoutExpired):
+                compare(slow)
+        self.assertEqual(self.runs(), 7)
+
+        # another input, or a changed program, runs again
+        compare(right, value=5)
+        self.assertEqual(self.runs(), 9)
+        with open("right.py", "a", encoding="utf-8") as f:
+            f.write("# changed\n")
+        compare(right, right_args)
+        self.assertEqual(self.runs(), 12)
+
+    def test_result_cache_entries(self):
+        with open("big.py", "w", encoding="utf-8") as f:
+            f.write("with open('runs.txt', 'a') as f:\n"
+                    "    f.write('.')\n"
+                    "print('x' * 1000000)\n")
+        with open("checker.py", "w", encoding="utf-8") as f:
+            f.write("import sys\n")
+        python = escape_path(sys.executable)
+        big = f"{python} big.py"
+        cache = ResultCache("results")
+        grader = CYaRonGraders.checker("CachedChecker", f"{python} checker.py")
+
+        def compare(grader):
+            with IO() as test:
+                test.input_writeln(21)
+                with captured_output():
+                    Compare.program(big,
+                                    input=test,
+                                    std_program=self.std,
+                                    grader=grader,
+                                    cache=cache)
+
+        # only the message of the mismatch is kept, not the outputs
+        for _ in range(2):
+            with self.assertRaises(CompareMismatch) as cm:
+                compare("NOIPStyle")
+            self.assertIn("On line 1", str(cm.exception.mismatch))
+        self.assertEqual(self.runs(), 2)
+        self.assertLess(
+            max(entry.stat().st_size for entry in os.scandir("results")), 4096)
+
+        # editing the checker invalidates its verdicts
+        compare(grader)
+        compare(grader)
+        self.assertEqual(self.runs(), 4)
+        with open("checker.py", "a", encoding="utf-8") as f:
+            f.write("sys.exit(1)\n")
+        with self.assertRaises(CompareMismatch):
+            compare(grader)
+        self.assertEqual(self.runs(), 6)
+
+    def test_result_cache_python_grader(self):
+        with open("close.py", "w", encoding="utf-8") as f:
+            f.write("print(42.01)\n")
+        close = f"{escape_path(sys.executable)} close.py"
+        cache = ResultCache("results")
+
+        def compare(grader):
+            with IO() as test:
+                test.input_writeln(21)
+                with captured_output():
+                    Compare.program(close,
+                                    input=test,
+                                    std_program=self.std,
+                                    grader=grader,
+                                    cache=cache)
+
+        # registering the name again with another eps invalidates its verdicts
+        compare(float_grader("CachedFloat", abs_eps=0.1))
+        with self.assertRaises(CompareMismatch):
+            compare(float_grader("CachedFloat", abs_eps=1e-9))
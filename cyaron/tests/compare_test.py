@@ -1,16 +1,38 @@
 import unittest
+import hashlib
 import os
 import sys
 import shutil
 import tempfile
 import subprocess
-from cyaron import IO, Compare, log, escape_path
+import locale
+import pickle
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from cyaron import IO, Compare, ResultCache, log, escape_path
 from cyaron.output_capture import captured_output
 from cyaron.graders.mismatch import *
-from cyaron.compare import CompareMismatch
+from cyaron.compare import CompareMismatch, CompareMismatchGroup
+from cyaron.graders import (CYaRonGraders, ExternalChecker, FileContent,
+                            TextContent)
+from cyaron.graders.fulltext import fulltext
+from cyaron.graders.noipstyle import noipstyle
+from cyaron.graders.floatstyle import float_grader
 
 log.set_verbose()
 
+# copies stdin to stdout byte for byte, like `cat`, which Windows lacks
+CAT = escape_path(sys.executable) + (
+    ' -c "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())"')
+
+
+@CYaRonGraders.grader("StdPath", file_content=True)
+def std_path(content, std):
+    """Reject every output with the path of std, to see how the workers get it."""
+    return False, std.path if isinstance(std, FileContent) else "not a file"
+
 
 class TestCompare(unittest.TestCase):
 
@@ -68,6 +90,23 @@ class TestCompare(unittest.TestCase):
             "test_another_incorrect.out: !!!INCORRECT!!! On line 2 column 7, read 4, expected 3."
         )
 
+    def test_noipstyle_chunks(self):
+        std = "1 2 \n\n33333 4\n\n\n"
+        cases = [
+            ("1 2\r\n\n33333 4", None),
+            ("1 2\n\n33334 4\n", "On line 3 column 5, read 4 4, expected 3 4."),
+            ("1 2\n\n33333 4 5\n", "Too long on line 3."),
+            ("1 2\n\n33333\n", "Too short on line 3."),
+            ("1 3\n\n33333 4\n5\n", "Too many or too few lines."),
+        ]
+        for content, message in cases:
+            for chunk_size in (1, 2, 3, 1 << 20):
+                result, mismatch = noipstyle(content, std, chunk_size)
+                self.assertEqual(result, message is None)
+                if message is not None:
+                    self.assertEqual(str(mismatch), message)
+                    self.assertEqual(mismatch.content, content)
+
     def test_fulltext_program(self):
         with open("correct.py", "w") as f:
             f.write("print(1)")
@@ -108,6 +147,27 @@ class TestCompare(unittest.TestCase):
         correct_out = f'{escape_path(sys.executable)} correct.py: Correct \n{escape_path(sys.executable)} incorrect.py: !!!INCORRECT!!! Hash mismatch: read 53c234e5e8472b6ac51c1ae1cab3fe06fad053beb8ebfd8977b010655bfdd3c3, expected 4355a46b19d348dc2f57c046f8ef63d4538ebb936000f3c9ee954a27460dd865'
         self.assertEqual(result, correct_out)
 
+    def test_fulltext_cache(self):
+        std = TextContent("1\n")
+        self.assertEqual(fulltext("1\n", std), (True, None))
+        self.assertEqual(
+            std.cache["sha256"],
+            "4355a46b19d348dc2f57c046f8ef63d4538ebb936000f3c9ee954a27460dd865")
+        std.cache["sha256"] = "0"  # the memo is used from now on
+        result, mismatch = fulltext("1\n", std)
+        self.assertFalse(result)
+        self.assertEqual(mismatch.std_hash, "0")
+        result, mismatch = fulltext("12\n", std)
+        self.assertIsInstance(mismatch, SizeMismatch)
+        self.assertIsInstance(mismatch, HashMismatch)
+        self.assertEqual((mismatch.content_size, mismatch.std_size), (3, 2))
+        self.assertEqual(
+            str(mismatch), "Hash mismatch: read {}, expected {}".format(
+                hashlib.sha256(b"12\n").hexdigest(),
+                hashlib.sha256(b"1\n").hexdigest()))
+        self.assertEqual(str(pickle.loads(pickle.dumps(mismatch))),
+                         str(mismatch))
+
     def test_file_input(self):
         with open("correct.py", "w") as f:
             f.write("print(input())")
@@ -131,6 +191,94 @@ class TestCompare(unittest.TestCase):
         correct_out = f'{escape_path(sys.executable)} correct.py: Correct'
         self.assertEqual(result, correct_out)
 
+    def test_compressed_files(self):
+        with captured_output() as (out, err):
+            with IO("std.in.gz", "std.out.gz") as std:
+                std.input_writeln("1 2")
+                std.output_writeln("1 2")
+                with open("ans.out", "w") as f:
+                    f.write("1 2\n")
+                Compare.output("ans.out", std=std)
+                Compare.program(CAT, input=std, std=std)
+
+        self.assertEqual(out.getvalue().strip(),
+                         "ans.out: Correct \n{}: Correct".format(CAT))
+
+    def test_file_content(self):
+        with open("empty.out", "w") as f:
+            pass
+        with open("big.out", "w") as f:
+            f.write("1 2\n" * 100000)
+        with FileContent("empty.out") as content:
+            self.assertEqual(content.size(), 0)
+            self.assertEqual(content.text(), "")
+        with FileContent("big.out") as content:
+            self.assertEqual(content.size(), 400000)
+            self.assertEqual(b"".join(content.iter_chunks(999)),
+                             b"1 2\n" * 100000)
+            copied = pickle.loads(pickle.dumps(content))
+            self.assertEqual(copied.path, "big.out")
+            self.assertEqual(copied.text(), content.text())
+            copied.close()
+
+        with captured_output() as (out, err):
+            Compare.output("big.out", std="big.out", grader="FullText")
+            Compare.output("big.out", std="big.out")
+        self.assertEqual(out.getvalue().strip(),
+                         "big.out: Correct \nbig.out: Correct")
+
+    def test_file_encoding(self):
+        with open("latin.out", "wb") as f:
+            f.write("caf\xe9 1\r\n".encode("latin-1"))
+        self.assertEqual(FileContent("latin.out").encoding,
+                         locale.getpreferredencoding(False))
+        with FileContent("latin.out", encoding="latin-1") as content:
+            self.assertEqual(content.text(), "caf\xe9 1\r\n")
+            copied = pickle.loads(pickle.dumps(content))
+            self.assertEqual(copied.encoding, "latin-1")
+            copied.close()
+            for grader in ("FullText", "NOIPStyle"):
+                self.assertTrue(
+                    CYaRonGraders.invoke(grader, content,
+                                         "caf\xe9 1\r\n")[0])
+
+        # output files are decoded with the locale encoding, the IO is UTF-8
+        with mock.patch("locale.getpreferredencoding",
+                        return_value="latin-1"):
+            with captured_output() as (out, err):
+                with IO("std.in", "std.out") as std:
+                    std.output_write("caf\xe9 1\r\n")
+                    Compare.output("latin.out", std=std, grader="FullText")
+        self.assertEqual(out.getvalue().strip(), "latin.out: Correct")
+
+    def test_program_result(self):
+        with open("correct.py", "w") as f:
+            f.write("print(input())")
+        with IO() as test:
+            test.input_writeln("233")
+            test.output_writeln("233")
+            results = Compare.program((sys.executable, "correct.py"),
+                                      f"{escape_path(sys.executable)} correct.py",
+                                      std=test,
+                                      input=test)
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertEqual(result.returncode, 0)
+            if os.name == "posix":
+                self.assertIsNotNone(result.cpu_time)
+                self.assertIsNotNone(result.max_rss)
+
+    def test_memory_limit(self):
+        if os.name != "posix":
+            return
+        with IO() as test:
+            with self.assertRaises(subprocess.CalledProcessError):
+                Compare.program((sys.executable, "-c",
+                                 "x = bytearray(1 << 30)"),
+                                std=test,
+                                input=test,
+                                memory_limit=256 << 20)
+
     def test_concurrent(self):
         programs = ['test{}.py'.format(i) for i in range(16)]
         for fn in programs:
@@ -168,3 +316,306 @@ class TestCompare(unittest.TestCase):
                     pass
                 else:
                     self.assertTrue(False)
+
+    def test_stream(self):
+        with open("slow_wrong.py", "w") as f:
+            # one write, so that the output is read in one piece
+            f.write("import sys, time\n"
+                    "sys.stdout.write('1\\n3\\n')\nsys.stdout.flush()\n"
+                    "time.sleep(10)\n")
+        with open("right.py", "w") as f:
+            f.write("print(1)\nprint(2)\n")
+        python = escape_path(sys.executable)
+
+        with captured_output() as (out, err):
+            with IO() as test:
+                test.output_writeln("1\n2")
+                Compare.program(f"{python} right.py",
+                                input=test,
+                                std=test,
+                                stream=True)
+                for grader in ("NOIPStyle", "FullText"):
+                    start = time.time()
+                    with self.assertRaises(CompareMismatch) as cm:
+                        Compare.program(f"{python} slow_wrong.py",
+                                        input=test,
+                                        std=test,
+                                        grader=grader,
+                                        stream=True)
+                    self.assertLess(time.time() - start, 5)
+                    self.assertEqual(cm.exception.mismatch.content, "1\n3\n")
+        self.assertIsInstance(cm.exception.mismatch, HashMismatch)
+        self.assertIn("On line 2 column 1, read 3, expected 2.",
+                      out.getvalue())
+
+    def test_noipstyle_stream(self):
+        std = "1 2 \n\n33333 4\n\n\n"
+        cases = [
+            ("1 2\r\n\n33333 4", None),
+            ("1 2\n\n33334 4\n", "On line 3 column 5, read 4 4, expected 3 4."),
+            ("1 2\n\n33333 4\n\n5", "Too many or too few lines."),
+            ("1 2\n\n33333", "Too short on line 3."),
+            ("1 2\n\n", "Too many or too few lines."),
+        ]
+        for content, message in cases:
+            for size in (1, 2, 1 << 20):
+                checker = CYaRonGraders.open_stream("NOIPStyle", std)
+                for i in range(0, len(content), size):
+                    if checker.feed(content[i:i + size]):
+                        break
+                result, mismatch = checker.result(content)
+                self.assertEqual(result, message is None)
+                if message is not None:
+                    self.assertEqual(str(mismatch), message)
+
+    def test_checker(self):
+        with open("checker.py", "w") as f:
+            f.write("import sys\n"
+                    "n, out, ans = (open(path).read().split()"
+                    " for path in sys.argv[1:4])\n"
+                    "if not out:\n"
+                    "    sys.stderr.write('unexpected eof')\n"
+                    "    sys.exit(8)\n"
+                    "if int(out[0]) < 0:\n"
+                    "    sys.exit(3)\n"
+                    "if int(out[0]) % int(n[0]):\n"
+                    "    sys.stderr.write('wrong answer %s is not "
+                    "a multiple of %s' % (out[0], n[0]))\n"
+                    "    sys.exit(1)\n")
+        with open("twice.py", "w") as f:
+            f.write("print(int(input()) * 2)\n")
+        with open("plus_one.py", "w") as f:
+            f.write("print(int(input()) + 1)\n")
+        python = escape_path(sys.executable)
+        grader = CYaRonGraders.checker("MultipleChecker",
+                                       f"{python} checker.py")
+
+        with captured_output() as (out, err):
+            with IO("check.in", "check.out") as test:
+                test.input_writeln(3)
+                for executor in ("thread", "process"):
+                    Compare.program(f"{python} twice.py",
+                                    input=test,
+                                    std_program=CAT,
+                                    grader=grader,
+                                    executor=executor)
+                    with self.assertRaises(CompareMismatch) as cm:
+                        Compare.program(f"{python} plus_one.py",
+                                        input=test,
+                                        std_program=CAT,
+                                        grader=grader,
+                                        executor=executor)
+                    mismatch = cm.exception.mismatch
+                    self.assertIsInstance(mismatch, CheckerMismatch)
+                    self.assertEqual(mismatch.verdict, "wrong answer")
+                    self.assertEqual(mismatch.returncode, 1)
+                    self.assertEqual(str(mismatch),
+                                     "wrong answer 4 is not a multiple of 3")
+                test.output_writeln(3)
+                with open("empty.out", "w") as f:
+                    pass
+                with open("six.out", "w") as f:
+                    f.write("6\n")
+                with open("negative.out", "w") as f:
+                    f.write("-3\n")
+                # the input of std is used by default
+                Compare.output("six.out", std=test, grader=grader)
+                Compare.output("six.out",
+                               std="check.out",
+                               input="check.in",
+                               grader=grader)
+                with self.assertRaises(CompareMismatch) as cm:
+                    Compare.output("empty.out", std=test, grader=grader)
+                self.assertEqual(str(cm.exception.mismatch),
+                                 "unexpected eof")
+                with self.assertRaises(subprocess.CalledProcessError):
+                    Compare.output("negative.out", std=test, grader=grader)
+
+                # a checker failure is not a verdict on the program
+                with open("negate.py", "w") as f:
+                    f.write("print(-int(input()))\n")
+                cache = ResultCache("results")
+                for executor in ("thread", "process"):
+                    with self.assertRaises(subprocess.CalledProcessError):
+                        Compare.program(f"{python} negate.py",
+                                        input=test,
+                                        std_program=CAT,
+                                        grader=grader,
+                                        executor=executor,
+                                        cache=cache)
+                    self.assertEqual(os.listdir("results"), [])
+                Compare.program(f"{python} twice.py",
+                                input=test,
+                                std_program=CAT,
+                                grader=grader,
+                                cache=cache)
+                self.assertEqual(len(os.listdir("results")), 1)
+
+    def test_checker_temp_files(self):
+        python = escape_path(sys.executable)
+        std = TextContent("1\n")
+        ExternalChecker(f"{python} -c pass")("1\n", std)
+        path = std.cache["checker_path"]
+        self.assertTrue(os.path.exists(path))  # kept for the next output
+        with self.assertRaises(subprocess.CalledProcessError):
+            ExternalChecker(f'{python} -c "exit(3)"')("1\n", std)
+        self.assertNotIn("checker_path", std.cache)
+        self.assertFalse(os.path.exists(path))
+
+        std = TextContent("1\n")
+        with self.assertRaises(subprocess.CalledProcessError):
+            ExternalChecker(f'{python} -c "exit(3)"')("1\n", std)
+        self.assertNotIn("checker_path", std.cache)
+
+    def test_float(self):
+        std = "3.14159265 2\nYES -1e9 inf\n"
+        cases = [
+            ("3.1415927 2.0000001  YES\n-1000000000.5 inf", None),
+            ("3.14159265 2\nYES -1e9 -inf",
+             "On line 2 column 10, read -inf, expected inf."),
+            ("3.1416 2 YES -1e9 inf",
+             "On line 1 column 1, read 3.1416, expected 3.14159265."),
+            ("3.14159265 2 NO -1e9 inf",
+             "On line 1 column 14, read NO, expected YES."),
+            ("3.14159265 2 YES -1e9", "Too many or too few tokens."),
+        ]
+        for content, message in cases:
+            for text in (content, TextContent(content)):
+                result, mismatch = CYaRonGraders.invoke("Float", text, std)
+                self.assertEqual(result, message is None)
+                if message is not None:
+                    self.assertEqual(str(mismatch), message)
+
+        grader = float_grader("Float1e-2", 1e-2, 0)
+        self.assertTrue(CYaRonGraders.invoke(grader, "1.005 0.001", "1 0")[0])
+        self.assertFalse(CYaRonGraders.invoke(grader, "1e9", "1.000001e9")[0])
+        with open("std.txt", "w") as f:
+            f.write(std)
+        with open("out.txt", "w") as f:
+            f.write("3.1415926\n2 YES -1e9 inf\n")
+        with captured_output():
+            Compare.output("out.txt", std="std.txt", grader="Float")
+
+    def test_process_pool(self):
+        for i in range(4):
+            with open("out{}.txt".format(i), "w") as f:
+                f.write("1\n{}\n".format(2 if i < 3 else 3))
+        with open("std.txt", "w") as f:
+            f.write("1\n2\n")
+        files = ["out{}.txt".format(i) for i in range(3)]
+
+        with captured_output() as (out, err):
+            Compare.output(*files, std="std.txt", executor="process")
+            with self.assertRaises(CompareMismatch) as cm:
+                Compare.output("out3.txt",
+                               std="std.txt",
+                               executor="process",
+                               grader="FullText")
+            with IO("pool.in", "pool.out") as test:
+                test.input_writeln(1)
+                test.input_writeln(2)
+                results = Compare.program(CAT,
+                                          CAT,
+                                          input=test,
+                                          std="std.txt",
+                                          executor="process",
+                                          max_workers=2)
+        self.assertEqual(cm.exception.name, "out3.txt")
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0].returncode, 0)
+        self.assertEqual(out.getvalue().count("Correct"), 5)
+
+    def test_process_pool_std_file(self):
+        # the output of std is written into one file, not sent with every task
+        with captured_output(), IO("pool.in", "pool.out") as test:
+            test.input_writeln(1)
+            with self.assertRaises(CompareMismatch) as cm:
+                Compare.program(CAT,
+                                input=test,
+                                std_program=CAT,
+                                grader="StdPath",
+                                executor="process")
+            path = cm.exception.mismatch
+            self.assertNotEqual(path, "not a file")
+            self.assertFalse(os.path.exists(path))
+        std = IO(open("std.in", "w+"), open("std.out", "w+"))
+        with captured_output(), std:
+            std.output_writeln(1)
+            with self.assertRaises(CompareMismatch) as cm:
+                Compare.output("pool.in",
+                               std=std,
+                               grader="StdPath",
+                               executor="process")
+            path = cm.exception.mismatch
+            self.assertNotEqual(path, "not a file")
+            self.assertFalse(os.path.exists(path))
+
+    @unittest.skipIf(sys.version_info < (3, 7), "needs mp_context")
+    def test_process_pool_spawn(self):
+        # the graders registered here are not registered in spawned workers
+        with open("checker.py", "w") as f:
+            f.write("import sys\n"
+                    "out = open(sys.argv[2]).read().split()\n"
+                    "ans = open(sys.argv[3]).read().split()\n"
+                    "sys.exit(out != ans)\n")
+        with open("std.txt", "w") as f:
+            f.write("1\n")
+        python = escape_path(sys.executable)
+        checker = CYaRonGraders.checker("SpawnChecker", f"{python} checker.py")
+        grader = float_grader("SpawnFloat", 0.5, 0)
+        context = multiprocessing.get_context("spawn")
+
+        with captured_output():
+            with ProcessPoolExecutor(1, mp_context=context) as pool, \
+                    IO("spawn.in", "spawn.out") as test:
+                test.input_writeln(1)
+                Compare.program(CAT,
+                                input=test,
+                                std_program=CAT,
+                                grader=checker,
+                                job_pool=pool)
+                with self.assertRaises(CompareMismatch):
+                    Compare.program("echo 2",
+                                    input=test,
+                                    std_program=CAT,
+                                    grader=checker,
+                                    job_pool=pool)
+                Compare.program("echo 1.4",
+                                input=test,
+                                std_program=CAT,
+                                grader=grader,
+                                job_pool=pool)
+                Compare.output("std.txt",
+                               std="std.txt",
+                               grader=checker,
+                               job_pool=pool)
+
+    def test_collect_mismatches(self):
+        python = escape_path(sys.executable)
+        with open("slow.py", "w") as f:
+            f.write("import time\ntime.sleep(2)\nprint(1)\n")
+        with captured_output() as (out, err):
+            with IO() as test:
+                test.output_writeln(1)
+                with self.assertRaises(CompareMismatchGroup) as cm:
+                    Compare.program("echo 2",
+                                    "echo 1",
+                                    "echo 3",
+                                    input=test,
+                                    std=test,
+                                    max_workers=2)
+                self.assertEqual(
+                    [e.name for e in cm.exception.mismatches],
+                    ["echo 2", "echo 3"])
+                self.assertIn("2 mismatches", str(cm.exception))
+
+                start = time.time()
+                with self.assertRaises(CompareMismatch) as cm:
+                    Compare.program("echo 2",
+                                    *[f"{python} slow.py"] * 4,
+                                    input=test,
+                                    std=test,
+                                    max_workers=1,
+                                    stop_on_incorrect=True)
+                self.assertEqual(cm.exception.name, "echo 2")
+                self.assertLess(time.time() - start, 4)
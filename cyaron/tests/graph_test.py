@@ -1,5 +1,8 @@
 import unittest
-from cyaron import Graph
+import random
+import sys
+from unittest import mock
+from cyaron import IO, Edge, Graph, Merger
 from random import randint
 
 
@@ -264,3 +267,186 @@ class TestGraph(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             Graph.from_degree_sequence(((2, 1), (0, 1)))
+
+    def test_compact(self):
+
+        def edge_tuples(edges):
+            return [(e.start, e.end, e.weight) for e in edges]
+
+        factories = [
+            lambda **kw: Graph.tree(50, 0.2, 0.2, weight_limit=10, **kw),
+            lambda **kw: Graph.binary_tree(50, **kw),
+            lambda **kw: Graph.graph(30, 80, directed=True, **kw),
+            lambda **kw: Graph.graph(30, 80, repeated_edges=False, **kw),
+            lambda **kw: Graph.DAG(30, 60, **kw),
+            lambda **kw: Graph.UDAG(30, 60, **kw),
+            lambda **kw: Graph.hack_spfa(30, **kw),
+            lambda **kw: Graph.forest(30, 4, **kw),
+            lambda **kw: Graph.from_degree_sequence((3, 2, 2, 2, 1), **kw),
+        ]
+        for factory in factories:
+            random.seed(1)
+            graph = factory()
+            random.seed(1)
+            compact = factory(compact=True)
+            self.assertTrue(compact.compact)
+            self.assertEqual(edge_tuples(compact.iterate_edges()),
+                             edge_tuples(graph.iterate_edges()))
+            self.assertEqual(len(compact.edges), len(graph.edges))
+            self.assertEqual([edge_tuples(v) for v in compact.edges],
+                             [edge_tuples(v) for v in graph.edges])
+            self.assertEqual(compact.edge_count(), graph.edge_count())
+            self.assertEqual(compact.to_str(), graph.to_str())
+            random.seed(2)
+            shuffled = graph.to_str(shuffle=True)
+            random.seed(2)
+            self.assertEqual(compact.to_str(shuffle=True), shuffled)
+
+        # weights that are not 64-bit ints
+        graph = Graph(3, compact=True)
+        graph.add_edge(1, 2, weight=5)
+        graph.add_edge(3, 3, weight=1.5)
+        graph.add_edge(2, 3, weight=1 << 70)
+        self.assertEqual(edge_tuples(graph.edges[3]), [(3, 3, 1.5),
+                                                       (3, 2, 1 << 70)])
+        self.assertEqual([len(v) for v in graph.edges[1:]], [1, 2, 2])
+        with self.assertRaises(IndexError):
+            graph.add_edge(1, 4)
+
+        merged = Merger(graph, Graph.tree(3, compact=True)).G
+        self.assertTrue(merged.compact)
+        self.assertEqual(merged.edge_count(), 5)
+
+    def test_to_str(self):
+        graph = Graph(4, directed=False)
+        graph.add_edge(3, 1, weight=5)
+        graph.add_edge(1, 2, weight=2.5)
+        graph.add_edge(4, 4)
+        self.assertEqual(graph.to_str(), "1 3 5\n1 2 2\n4 4 1")
+        self.assertEqual(graph.to_str(output=Edge.unweighted_edge),
+                         "1 3\n1 2\n4 4")
+        dashed = graph.to_str(output=lambda e: "%d-%d" % (e.start, e.end))
+        self.assertEqual(dashed, "1-3\n1-2\n4-4")
+        with self.assertRaises(AttributeError):
+            Edge(1, 2, 3).color = "red"
+
+        for directed in (False, True):
+            graph = Graph.graph(30, 80, directed=directed, weight_limit=9)
+            edges = list(graph.iterate_edges())
+            random.seed(1)
+            shuffled = graph.to_str(shuffle=True, output=str)
+            random.seed(1)
+            custom = graph.to_str(shuffle=True, output=lambda e: str(e) + ";")
+            self.assertEqual(custom.replace(";", ""), shuffled)
+            lines = shuffled.split("\n")
+            self.assertEqual(len(lines), len(edges))
+            self.assertEqual(sorted(int(line.split()[2]) for line in lines),
+                             sorted(edge.weight for edge in edges))
+
+    def test_degree(self):
+        for directed in (False, True):
+            for compact in (False, True):
+                graph = Graph.graph(40,
+                                    150,
+                                    directed=directed,
+                                    self_loop=True,
+                                    repeated_edges=True,
+                                    compact=compact)
+                edges = list(graph.iterate_edges())
+                self.assertEqual(graph.edge_count(), len(edges))
+                in_degree, out_degree = [0] * 41, [0] * 41
+                for edge in edges:
+                    out_degree[edge.start] += 1
+                    in_degree[edge.end] += 1
+                for v in range(1, 41):
+                    self.assertEqual(graph.degree(v),
+                                     in_degree[v] + out_degree[v])
+                    if directed:
+                        self.assertEqual(graph.in_degree(v), in_degree[v])
+                        self.assertEqual(graph.out_degree(v), out_degree[v])
+
+        graph = Graph(3)
+        graph.add_edge(1, 1)
+        graph.add_edge(1, 2)
+        self.assertEqual([graph.degree(v) for v in range(1, 4)], [3, 1, 0])
+        merger = Merger(graph, Graph.tree(5))
+        merger.add_edge((0, 3), (1, 1))
+        self.assertEqual(merger.G.edge_count(), 7)
+        self.assertEqual(merger.G.degree(3), 1)
+        self.assertEqual(merger.G.degree(1), 3)
+
+    def test_write_to(self):
+        chunk_size = Graph.ITER_CHUNK_SIZE
+        Graph.ITER_CHUNK_SIZE = 7
+        try:
+            for compact in (False, True):
+                graph = Graph.graph(30, 50, weight_limit=9, compact=compact)
+                for kwargs in (dict(), dict(output=Edge.unweighted_edge),
+                               dict(shuffle=True)):
+                    random.seed(1)
+                    text = graph.to_str(**kwargs)
+                    random.seed(1)
+                    self.assertEqual(list(graph.iter_lines(**kwargs)),
+                                     text.split("\n"))
+                    with IO() as test:
+                        test.input_write(1)
+                        random.seed(1)
+                        graph.write_to(test, **kwargs)
+                        test.input_writeln(2)
+                        test.input_file.seek(0)
+                        self.assertEqual(test.input_file.read(),
+                                         "1 " + text + "\n2\n")
+            with IO() as test:
+                Graph(3).write_to(test)
+                test.input_file.seek(0)
+                self.assertEqual(test.input_file.read(), "\n")
+        finally:
+            Graph.ITER_CHUNK_SIZE = chunk_size
+
+    def test_anonymize(self):
+        for directed in (False, True):
+            for compact in (False, True):
+                graph = Graph.graph(40,
+                                    120,
+                                    directed=directed,
+                                    weight_limit=9,
+                                    compact=compact)
+                text = graph.to_str(shuffle=True, seed="233")
+                self.assertEqual(graph.to_str(shuffle=True, seed="233"), text)
+                self.assertNotEqual(graph.to_str(shuffle=True, seed="234"),
+                                    text)
+                lines = list(graph.iter_lines(shuffle=True, seed=1))
+                self.assertEqual("\n".join(lines),
+                                 graph.to_str(shuffle=True, seed=1))
+
+                anonymous = graph.anonymize("233")
+                self.assertEqual(anonymous.edge_count(), graph.edge_count())
+                self.assertEqual(anonymous.compact, compact)
+                self.assertEqual(sorted(map(anonymous.degree, range(41))),
+                                 sorted(map(graph.degree, range(41))))
+                self.assertEqual(anonymous.to_str(),
+                                 graph.anonymize("233").to_str())
+
+                def edge_set(lines):
+                    edges = []
+                    for line in lines:
+                        u, v, w = map(int, line.split())
+                        if not directed:
+                            u, v = sorted((u, v))
+                        edges.append((u, v, w))
+                    return sorted(edges)
+
+                self.assertEqual(edge_set(anonymous.iter_lines()),
+                                 edge_set(text.split("\n")))
+
+                # NumPy only applies the shuffle, so it does not change it
+                with mock.patch.object(sys.modules["cyaron.graph"], "np",
+                                       None):
+                    self.assertEqual(graph.to_str(shuffle=True, seed="233"),
+                                     text)
+                    self.assertEqual(anonymous.to_str(),
+                                     graph.anonymize("233").to_str())
+
+        self.assertEqual(
+            Graph.chain(6).anonymize(seed=4).to_str(),
+            "1 5 1\n1 3 1\n2 3 1\n4 6 1\n5 6 1")
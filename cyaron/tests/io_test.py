@@ -5,9 +5,23 @@ import time
 import shutil
 import tempfile
 import subprocess
+import gzip
+import io
+import lzma
+from array import array
+import cyaron.utils
 from cyaron import IO, escape_path
 from cyaron.output_capture import captured_output
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# copies stdin to stdout byte for byte, like `cat`, which Windows lacks
+CAT = escape_path(sys.executable) + (
+    ' -c "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())"')
+
 
 class TestIO(unittest.TestCase):
 
@@ -76,6 +90,36 @@ class TestIO(unittest.TestCase):
             output = f.read()
         self.assertEqual(output, b"233\n")
 
+    def test_output_gen_string_io(self):
+        output = io.StringIO()
+        with captured_output():
+            test = IO(open("test_gen.in", "w+"), output)
+            test.input_writeln(233)
+            test.output_gen(CAT)
+        self.assertEqual(output.getvalue(), "233\n")
+        test.close()
+
+    def test_output_gen_stream(self):
+        with open("crlf.py", "w", encoding="utf-8") as f:
+            f.write("import sys\n"
+                    "sys.stdout.buffer.write(b'1\\r\\n22\\r\\r\\n3\\r4\\r')\n")
+        cmd = f"{escape_path(sys.executable)} crlf.py"
+        old_chunk_size = cyaron.utils._FD_CHUNK_SIZE
+        cyaron.utils._FD_CHUNK_SIZE = 3  # split "\r\n" across chunks
+        try:
+            with IO("test_stream.in", "test_stream.out") as test:
+                test.output_write("head")
+                test.output_gen(cmd, stream=True)
+                test.output_writeln()
+            with IO("test_stream_raw.in", "test_stream_raw.out") as test:
+                test.output_gen(cmd, stream=True, replace_EOL=False)
+        finally:
+            cyaron.utils._FD_CHUNK_SIZE = old_chunk_size
+        with open("test_stream.out", "rb") as f:
+            self.assertEqual(f.read(), b"head1\n22\n\n3\n4\n\n")
+        with open("test_stream_raw.out", "rb") as f:
+            self.assertEqual(f.read(), b"1\r\n22\r\r\n3\r4\r")
+
     def test_output_gen_time_limit_exceeded(self):
         with captured_output():
             TIMEOUT = 0.02
@@ -114,6 +158,56 @@ class TestIO(unittest.TestCase):
             output = f.read()
         self.assertEqual(output, "1\n")
 
+    def test_output_gen_all(self):
+        with open("double.py", "w", encoding="utf-8") as f:
+            f.write("print(int(input()) * 2)")
+        ios = [
+            IO("all{}.in".format(i), "all{}.out".format(i)) for i in range(6)
+        ]
+        try:
+            for i, test in enumerate(ios):
+                test.input_writeln(i)
+            IO.output_gen_all(ios[:3],
+                              f"{escape_path(sys.executable)} double.py",
+                              max_workers=2)
+            IO.output_gen_all(ios[3:], [sys.executable, "double.py"],
+                              stream=True)
+        finally:
+            for test in ios:
+                test.close()
+        for i in range(6):
+            with open("all{}.out".format(i), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "{}\n".format(i * 2))
+
+    def test_output_gen_async_time_limit_exceeded(self):
+        with IO("test_async.in", "test_async.out") as test:
+            with self.assertRaises(subprocess.TimeoutExpired):
+                IO.output_gen_all(
+                    [test],
+                    [sys.executable, "-c", "import time; time.sleep(5)"],
+                    time_limit=0.2)
+
+    def test_output_gen_result(self):
+        with open("alloc.py", "w", encoding="utf-8") as f:
+            f.write("x = bytearray(int(input()) << 20)\n"
+                    "print(len(x))")
+        cmd = f"{escape_path(sys.executable)} alloc.py"
+        with IO("test_result.in", "test_result.out") as test:
+            test.input_writeln(64)
+            result = test.output_gen(cmd)
+        self.assertEqual(result.returncode, 0)
+        self.assertGreaterEqual(result.wall_time, 0)
+        if os.name == "posix":
+            # AccountedPopen._try_wait hooks into a CPython internal
+            self.assertIsNotNone(result.cpu_time,
+                                 "AccountedPopen._try_wait was not called")
+            self.assertGreater(result.cpu_time, 0)
+            self.assertGreaterEqual(result.max_rss, 64 << 20)
+            with IO("test_limit.in", "test_limit.out") as test:
+                test.input_writeln(1024)
+                result = test.output_gen(cmd, memory_limit=256 << 20)
+            self.assertNotEqual(result.returncode, 0)
+
     def test_init_overload(self):
         with IO(file_prefix="data{", data_id=5) as test:
             self.assertEqual(test.input_filename, "data{5.in")
@@ -173,3 +267,92 @@ class TestIO(unittest.TestCase):
             output_text = f.read()
         self.assertEqual(input_text, "This Cleared content.")
         self.assertEqual(output_text, "This Cleared content.")
+
+    def test_buffered_write(self):
+
+        def write_stuff(test):
+            test.input_write(1, 2, 3)
+            test.input_writeln([4, 5, 6])
+            test.input_writeln(7, [8, [9, "\n", 10]], (), [])
+            test.input_write(["a", "b"], separator=",")
+            test.input_writeln()
+            test.output_write([9, 8], 7)
+            test.output_writeln(6, 5, 4)
+            test.output_writeln([3], 2, [1])
+
+        with IO("test_unbuffered.in", "test_unbuffered.out") as test:
+            write_stuff(test)
+        with IO("test_buffered.in", "test_buffered.out",
+                buffer_size=4) as test:
+            write_stuff(test)
+        with IO("test_buffered_large.in",
+                "test_buffered_large.out",
+                buffer_size=1 << 20) as test:
+            write_stuff(test)
+            test.flush_buffer()
+            test.input_file.seek(0)
+            self.assertEqual(test.input_file.read().count("\n"), 4)
+
+        for suffix in (".in", ".out"):
+            with open("test_unbuffered" + suffix, "rb") as f:
+                expected = f.read()
+            for prefix in ("test_buffered", "test_buffered_large"):
+                with open(prefix + suffix, "rb") as f:
+                    self.assertEqual(f.read(), expected)
+
+    def test_write_arrays(self):
+        with IO("test_array.in", "test_array.out") as test:
+            test.input_writeln(array("i", [1, -2, 3]))
+            test.input_writeln(0, memoryview(array("q", [4, 5])), [6])
+            test.input_writeln(array("d", [0.5, 2.0]), separator=",")
+            test.input_writeln(array("i"), 7)
+        with open("test_array.in", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "1 -2 3\n0 4 5 6\n0.5,2.0\n7\n")
+
+    @unittest.skipIf(np is None, "NumPy is not installed")
+    def test_write_numpy_arrays(self):
+        values = [0, -1, 9, 10, -10, 2**31 - 1, -2**31, 123456789]
+        with IO("test_numpy.in", "test_numpy.out") as test:
+            test.input_writeln(np.array(values, dtype=np.int32))
+            test.input_writeln(np.array([[1, 2], [3, 4]], dtype=np.uint8),
+                               separator=", ")
+            test.input_writeln(np.array([2**64 - 1], dtype=np.uint64),
+                               np.array([-2**63], dtype=np.int64))
+            test.input_writeln([np.array([5, 6]), 7], np.array([0.25]))
+        with open("test_numpy.in", encoding="utf-8") as f:
+            self.assertEqual(
+                f.read(), " ".join(map(str, values)) + "\n"
+                "1, 2, 3, 4\n"
+                "18446744073709551615 -9223372036854775808\n"
+                "5 6 7 0.25\n")
+
+    def test_write_iterators(self):
+        with IO("test_iter.in", "test_iter.out") as test:
+            test.ITER_CHUNK_SIZE = 3
+            test.input_writeln(i * i for i in range(1, 8))
+            test.input_writeln(0, [map(str, range(2)), iter([])], 9)
+            test.input_write(x for x in (1, "\n", 2, "\n"))
+            test.input_writeln(iter([[1, 2], (3, )]), separator=",")
+        with open("test_iter.in", encoding="utf-8") as f:
+            self.assertEqual(f.read(),
+                             "1 4 9 16 25 36 49\n0 0 1 9\n1\n2\n1,2,3\n")
+
+    def test_compressed_files(self):
+        with captured_output():
+            with IO(file_prefix="test_gz", compression="gzip") as test:
+                test.input_writeln(1, 2)
+                test.flush_buffer()
+                test.input_writeln(3)
+                test.output_gen(CAT)
+                test.output_writeln("end")
+            with IO("test_xz.in.xz", "test_xz.out.xz") as test:
+                test.input_writeln("a\r\nb")
+                test.output_gen(CAT, stream=True)
+                test.output_gen(CAT, replace_EOL=False)
+        self.assertFalse(os.path.exists("test_gz.in"))
+        with gzip.open("test_gz.in.gz", "rb") as f:
+            self.assertEqual(f.read(), b"1 2\n3\n")
+        with gzip.open("test_gz.out.gz", "rb") as f:
+            self.assertEqual(f.read(), b"1 2\n3\nend\n")
+        with lzma.open("test_xz.out.xz", "rb") as f:
+            self.assertEqual(f.read(), b"a\nb\na\r\nb\n")
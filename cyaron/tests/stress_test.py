@@ -0,0 +1,148 @@
+import unittest
+import os
+import random
+import sys
+import shutil
+import subprocess
+import tempfile
+from cyaron import Stress, escape_path
+from cyaron.compare import CompareMismatch
+
+
+def generate(io, round_id):
+    io.input_writeln(random.randint(1, 100), random.randint(1, 100))
+
+
+def generate_sized(io, size):
+    io.input_writeln([random.randint(1, 100) for _ in range(size)])
+
+
+class TestStress(unittest.TestCase):
+
+    def setUp(self):
+        self.original_directory = os.getcwd()
+        self.temp_directory = tempfile.mkdtemp()
+        os.chdir(self.temp_directory)
+        with open("brute.py", "w") as f:
+            f.write("a, b = map(int, input().split())\nprint(a + b)\n")
+        with open("wrong.py", "w") as f:
+            f.write("a, b = map(int, input().split())\n"
+                    "print(a + b if a < 90 else a - b)\n")
+        with open("sum_brute.py", "w") as f:
+            f.write(
+                "import sys\nprint(sum(map(int, sys.stdin.read().split())))\n")
+        with open("sum_wrong.py", "w") as f:
+            f.write("import sys\n"
+                    "print(sum(x for x in map(int, sys.stdin.read().split())"
+                    " if x < 90))\n")
+        with open("slow.py", "w") as f:
+            f.write("import time\ntime.sleep(5)\n")
+        python = escape_path(sys.executable)
+        self.brute = f"{python} brute.py"
+        self.wrong = f"{python} wrong.py"
+        self.slow = f"{python} slow.py"
+        self.sum_brute = f"{python} sum_brute.py"
+        self.sum_wrong = f"{python} sum_wrong.py"
+
+    def tearDown(self):
+        os.chdir(self.original_directory)
+        try:
+            shutil.rmtree(self.temp_directory)
+        except:
+            pass
+
+    def test_no_counterexample(self):
+        result = Stress(generate, self.brute, self.brute).run(5, max_workers=1)
+        self.assertEqual(result.rounds, 5)
+        self.assertIsNone(result.failure)
+        self.assertGreater(result.throughput, 0)
+        self.assertFalse(os.path.exists("stress_failed.in"))
+
+    def test_counterexample(self):
+        stress = Stress(generate, self.brute, self.wrong)
+        round_ids = []
+        for max_workers in (1, 2):
+            result = stress.run(seed="233",
+                                max_workers=max_workers,
+                                batch_size=4,
+                                save_input="failed.in")
+            failure = result.failure
+            self.assertIsInstance(failure.error, CompareMismatch)
+            self.assertEqual(failure.input_path, "failed.in")
+            with open("failed.in") as f:
+                self.assertGreaterEqual(int(f.read().split()[0]), 90)
+            # the round is reproducible from its seed
+            random.seed(failure.seed)
+            self.assertGreaterEqual(random.randint(1, 100), 90)
+            round_ids.append(failure.round_id)
+        self.assertEqual(round_ids[0], round_ids[1])
+        self.assertEqual(os.listdir().count("failed.in"), 1)
+        self.assertEqual(len([f for f in os.listdir() if f.endswith(".in")]),
+                         1)
+
+    def test_parallel_without_saving(self):
+        with open("always_wrong.py", "w") as f:
+            f.write("print(0)\n")
+        wrong = f"{escape_path(sys.executable)} always_wrong.py"
+        result = Stress(generate, self.brute, wrong).run(seed="233",
+                                                         max_workers=4,
+                                                         batch_size=1,
+                                                         save_input=None)
+        self.assertEqual(result.failure.round_id, 0)
+        self.assertIsNone(result.failure.input_path)
+        self.assertEqual([f for f in os.listdir() if f.endswith(".in")], [])
+
+    def test_time_limit(self):
+        result = Stress(generate, self.brute, self.slow,
+                        time_limit=0.2).run(3, max_workers=1)
+        self.assertIsInstance(result.failure.error, subprocess.TimeoutExpired)
+        self.assertEqual(result.rounds, 1)
+
+    def test_shrink(self):
+        with open("failed.in", "w") as f:
+            for i in range(40):
+                f.write("{} {}\n".format(i, 95 if i == 29 else i + 1))
+        stress = Stress(generate, self.sum_brute, self.sum_wrong)
+        for max_workers in (1, 2):
+            result = stress.shrink("failed.in", max_workers=max_workers)
+            self.assertEqual(result.input, "29 95\n")
+            self.assertEqual(result.size, 1)
+            self.assertLessEqual(result.runs, 256)
+            self.assertIsInstance(result.error, CompareMismatch)
+            with open("stress_shrunk.in") as f:
+                self.assertEqual(f.read(), "29 95\n")
+        result = stress.shrink("failed.in",
+                               unit="token",
+                               max_workers=1,
+                               save_input=None)
+        self.assertEqual(result.input, "95\n")
+        self.assertIsNone(result.input_path)
+
+    def test_shrink_budget(self):
+        with open("failed.in", "w") as f:
+            f.write("".join("{}\n".format(i) for i in range(60, 100)))
+        stress = Stress(generate, self.sum_brute, self.sum_wrong)
+        result = stress.shrink("failed.in", budget=3, max_workers=1)
+        self.assertEqual(result.runs, 3)
+        self.assertGreater(result.size, 1)
+        with open("passed.in", "w") as f:
+            f.write("1\n2\n")
+        with self.assertRaises(ValueError):
+            stress.shrink("passed.in", max_workers=1)
+
+    def test_shrink_generator(self):
+        stress = Stress(generate, self.sum_brute, self.sum_wrong)
+        results = []
+        for max_workers in (1, 3):
+            result = stress.shrink_generator(generate_sized, [1, 2, 5, 10],
+                                             seed="233",
+                                             max_workers=max_workers)
+            numbers = list(map(int, result.input.split()))
+            self.assertEqual(len(numbers), result.size)
+            self.assertGreaterEqual(max(numbers), 90)
+            results.append(result.input)
+        self.assertEqual(results[0], results[1])
+        self.assertIsNone(
+            Stress(generate, self.sum_brute,
+                   self.sum_brute).shrink_generator(generate_sized, [1, 2],
+                                                    max_workers=1))
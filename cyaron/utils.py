@@ -3,13 +3,27 @@ import os
 import shlex
 import sys
 import random
-from typing import cast, Any, Dict, Iterable, Tuple, Union
+from array import array
+from io import IOBase
+from typing import cast, Any, Dict, Iterable, Iterator, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 __all__ = [
-    "ati", "list_like", "int_like", "strtolines", "make_unicode",
-    "unpack_kwargs", "process_args", "escape_path"
+    "ati", "list_like", "array_like", "iterator_like", "int_like",
+    "strtolines", "make_unicode", "array_to_str", "unpack_kwargs",
+    "process_args", "escape_path"
 ]
 
+_FD_CHUNK_SIZE = 1 << 20
+
+_ARRAY_TYPES = (array, memoryview)
+if np is not None:
+    _ARRAY_TYPES += (np.ndarray, )
+
 
 def ati(array: Iterable[Any]):
     """Convert all the elements in the array and return them in a list."""
@@ -21,6 +35,22 @@ def list_like(data: Any):
     return isinstance(data, (tuple, list))
 
 
+def array_like(data: Any):
+    """
+    Judge whether the object data is a typed numeric array,
+    such as `array.array`, `memoryview` or `numpy.ndarray`.
+    """
+    return isinstance(data, _ARRAY_TYPES)
+
+
+def iterator_like(data: Any):
+    """
+    Judge whether the object data is an iterator, like a generator or a `map` object.
+    File objects are not considered as iterators.
+    """
+    return isinstance(data, Iterator) and not isinstance(data, IOBase)
+
+
 def int_like(data: Any):
     """Judge whether the object data is like a int."""
     return isinstance(data, int)
@@ -45,6 +75,111 @@ def make_unicode(data: Any):
     return str(data)
 
 
+def array_to_str(data: Any, separator: str = " "):
+    """
+    Convert all the elements in the typed array `data` to str and join them with `separator`.
+    Multi-dimensional arrays are flattened. Integer arrays are encoded in one vectorized pass
+    when NumPy is available; otherwise every element is converted by `make_unicode`.
+    """
+    if np is not None:
+        try:
+            arr = np.asarray(data)
+        except (TypeError, ValueError):
+            pass  # buffer formats NumPy does not understand
+        else:
+            if arr.dtype.kind in "iu":
+                return _encode_int_array(arr.ravel(), separator)
+            return separator.join(map(make_unicode, arr.ravel().tolist()))
+    items = data.tolist()
+    if isinstance(data, memoryview) and data.ndim > 1:
+        items = _flatten(items)
+    return separator.join(map(make_unicode, items))
+
+
+def _flatten(items):
+    for item in items:
+        if isinstance(item, list):
+            yield from _flatten(item)
+        else:
+            yield item
+
+
+def _encode_int_array(arr, separator: str, chunk_size: int = 1 << 20):
+    """Encode a 1-D NumPy integer array as decimal text without creating Python ints."""
+    return separator.join(
+        _encode_int_chunk(arr[i:i + chunk_size], separator)
+        for i in range(0, arr.size, chunk_size))
+
+
+def _encode_int_chunk(arr, separator: str):
+    """
+    Encode every number as a row of a byte matrix laid out as
+    [sign][right-aligned digits][separator], then keep the used cells.
+    """
+    count = arr.size
+    if arr.dtype.kind == "u":
+        neg = np.zeros(count, dtype=bool)
+        mag = arr.astype(np.uint64)
+    else:
+        neg = arr < 0
+        mag = arr.astype(np.int64).view(np.uint64)
+        # two's complement negation also works for the minimum of int64
+        mag = np.where(neg, ~mag + np.uint64(1), mag)
+
+    width = 1
+    digits = np.ones(count, dtype=np.int64)
+    max_mag = int(mag.max())
+    while 10**width <= max_mag:
+        digits += mag >= np.uint64(10**width)
+        width += 1
+
+    if max_mag < 1 << 63:
+        mag = mag.astype(np.int64)  # signed division is faster
+    sep = np.frombuffer(separator.encode("utf-8"), dtype=np.uint8)
+    table = np.empty((count, 1 + width + sep.size), dtype=np.uint8)
+    table[:, 0] = ord("-")
+    rest = mag
+    for col in range(width, 0, -1):
+        rest, table[:, col] = np.divmod(rest, 10)
+    table[:, 1:width + 1] += ord("0")
+    table[:, width + 1:] = sep
+
+    used = np.empty(table.shape, dtype=bool)
+    used[:, 0] = neg
+    used[:, 1:width + 1] = np.arange(width, 0, -1) <= digits[:, None]
+    used[:, width + 1:] = True
+    used[-1, width + 1:] = False
+    return table[used].tobytes().decode("utf-8")
+
+
+def _read_fd(fd: int, start: int = 0, end: Union[int, None] = None):
+    """
+    Yield the bytes of the file descriptor `fd` from `start` to `end` (or EOF) in chunks.
+    The offset of `fd` is restored afterwards, and it may be moved between chunks.
+    """
+    saved = os.lseek(fd, 0, os.SEEK_CUR)
+    pos = start
+    try:
+        while end is None or pos < end:
+            size = _FD_CHUNK_SIZE if end is None else min(
+                end - pos, _FD_CHUNK_SIZE)
+            os.lseek(fd, pos, os.SEEK_SET)
+            chunk = os.read(fd, size)
+            if not chunk:
+                break
+            pos += len(chunk)
+            yield chunk
+    finally:
+        os.lseek(fd, saved, os.SEEK_SET)
+
+
+def _write_fd(fd: int, data: bytes):
+    """Write all of `data` into the file descriptor `fd`."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
 def unpack_kwargs(
     funcname: str,
     kwargs: Dict[str, Any],
@@ -77,10 +212,14 @@ def process_args():
     Process the command line arguments.
     Now we support:
         - randseed: set the random seed
+    Returns the random seed given by `--randseed`, or None if there isn't one.
     """
+    seed = None
     for s in sys.argv:
         if s.startswith("--randseed="):
-            random.seed(s.split("=")[1])
+            seed = s.split("=")[1]
+            random.seed(seed)
+    return seed
 
 def escape_path(path: str) -> str:
     """Escape the path."""